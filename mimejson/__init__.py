@@ -9,6 +9,13 @@ of MIMEJSON is likely to evolve through iteration.
 import os
 from .mimejson import MIMEJSON
 from .codec import CodecRegister
+from .lazy import LazyBlob
+from .cache import BlobCache
+from .records import RecordReader, RecordWriter
+from .stats import Instrumentation
+from .storage import DirectoryStorage, MemoryStorage, TmpfsStorage
+from .video import Video
 
 __version__ = open(os.path.join(os.path.dirname(__file__), "VERSION"), "r").read()
-__all__ = ('MIMEJSON', 'CodecRegister', '__version__')
+__all__ = ('MIMEJSON', 'CodecRegister', 'LazyBlob', 'BlobCache', 'DirectoryStorage', 'MemoryStorage', 'TmpfsStorage',
+           'Instrumentation', 'RecordReader', 'RecordWriter', 'Video', '__version__')
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD 2014-2016
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+"""
+Asyncio transport for MIMEJSON.
+
+The transport implements a minimal HTTP/1.1 client over asyncio streams, one connection per request.
+"""
+import asyncio
+import base64
+import io
+import ssl
+import urllib.parse
+import weakref
+
+from .jsonlib import get_backend
+from .multipart import CHUNK_SIZE, MultipartBody
+from .stats import span
+
+SENDFILE_THRESHOLD = 1 << 20
+
+
+def _has_fileno(fp):
+    try:
+        fp.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+    return True
+
+
+class HTTPError(IOError):
+
+    """
+    Error status returned by a HTTP server.
+    """
+
+    def __init__(self, status, reason, url):
+        """
+        Create the error of a response status.
+        """
+        IOError.__init__(self, "HTTP %d %s: %s" % (status, reason, url))
+        self.status = status
+
+
+class AsyncHTTPTransport(object):
+
+    """
+    Responsible for storing data/pulling on servers, from an asyncio event loop.
+    """
+
+    def __init__(self, server, user=None, password=None, limit=16, timeout=None, ssl_context=None,
+                 instrumentation=None, json_backend=None):
+        """
+        Create an asyncio HTTP transport for MIMEJSON.
+
+        :param limit: maximum number of requests in flight
+        :param timeout: timeout in seconds of each request
+        :param instrumentation: `mimejson.stats.Instrumentation` measuring uploads and downloads
+        :param json_backend: JSON backend encoding the fields of queries and parsing responses, see
+            `mimejson.jsonlib.get_backend`
+        """
+        self.url = server
+        self.instrumentation = instrumentation
+        self.json = get_backend(json_backend)
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.headers = {}
+        if user:
+            credentials = ("%s:%s" % (user, password)).encode('utf-8')
+            self.headers['Authorization'] = "Basic " + base64.b64encode(credentials).decode('ascii')
+        self.limit = limit
+        self._semaphores = weakref.WeakKeyDictionary()  # < running event loop -> semaphore of its requests
+
+    async def send(self, files, data, url=None):
+        """
+        Send files and form fields to a remote location as a multipart query.
+
+        :param files: dict of binary files to be sent, indexed by part name
+        :param data: dict of form fields
+        :return: the JSON decoded response
+        """
+        fields = dict((k, v if isinstance(v, (str, bytes)) else self.json.dumpb(v)) for k, v in (data or {}).items())
+        body = MultipartBody(fields, files)
+        headers = {'Content-Type': body.content_type, 'Content-Length': str(body.length)}
+        with span(self.instrumentation, 'transport', 'upload') as s:
+            _status, _headers, content = await self.request("POST", url or self.url, headers, body)
+            s.bytes_out = body.length
+            s.bytes_in = len(content)
+        return self.json.loads(content)
+
+    async def get(self, url):
+        """
+        Receive content from a remote location.
+
+        :return: the content as bytes
+        """
+        with span(self.instrumentation, 'transport', 'download') as s:
+            _status, _headers, content = await self.request("GET", url)
+            s.bytes_in = len(content)
+        return content
+
+    def _semaphore(self):
+        """
+        Return the semaphore limiting the requests in flight in the running event loop.
+
+        Semaphores are bound to an event loop, the transport can be used by several ones in turn (`asyncio.run`).
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.limit)
+        return semaphore
+
+    async def request(self, method, url, headers=None, body=None):
+        """
+        Perform a HTTP request.
+
+        :param body: None, bytes or a `MultipartBody`
+        :return: the status, the headers (with lowercase names) and the content of the response
+        """
+        async with self._semaphore():
+            if self.timeout is None:
+                return await self._request(method, url, headers, body)
+            return await asyncio.wait_for(self._request(method, url, headers, body), self.timeout)
+
+    async def _request(self, method, url, headers, body):
+        parts = urllib.parse.urlsplit(url)
+        secure = parts.scheme == "https"
+        port = parts.port or (443 if secure else 80)
+        context = (self.ssl_context or ssl.create_default_context()) if secure else None
+        reader, writer = await asyncio.open_connection(parts.hostname, port, ssl=context)
+        try:
+            target = parts.path or "/"
+            if parts.query:
+                target += "?" + parts.query
+            all_headers = {'Host': parts.netloc, 'Connection': 'close', 'Accept-Encoding': 'identity'}
+            all_headers.update(self.headers)
+            all_headers.update(headers or {})
+            if isinstance(body, bytes):
+                all_headers['Content-Length'] = str(len(body))
+            head = "%s %s HTTP/1.1\r\n" % (method, target)
+            head += "".join("%s: %s\r\n" % kv for kv in all_headers.items()) + "\r\n"
+            writer.write(head.encode('latin-1'))
+            if isinstance(body, bytes):
+                writer.write(body)
+            elif body is not None:
+                await self._write_body(writer, body)
+            await writer.drain()
+            return await self._read_response(reader, url)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                # the response has been read, errors closing the connection do not matter
+                pass
+
+    async def _write_body(self, writer, body):
+        loop = asyncio.get_running_loop()
+        for segment in body.segments():
+            if isinstance(segment, bytes):
+                writer.write(segment)
+                continue
+            fp, remaining = segment
+            if remaining >= SENDFILE_THRESHOLD and _has_fileno(fp):
+                # large parts are sent by the kernel when the socket allows it
+                await writer.drain()
+                await loop.sendfile(writer.transport, fp, fp.tell(), remaining)
+                continue
+            while remaining > 0:
+                chunk = await loop.run_in_executor(None, fp.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError("mimejson: %r is shorter than expected" % (fp,))
+                remaining -= len(chunk)
+                writer.write(chunk)
+                await writer.drain()
+
+    async def _read_response(self, reader, url):
+        status_line = (await reader.readline()).decode('latin-1')
+        if not status_line:
+            raise IOError("mimejson: connection closed by %s" % (url,))
+        _version, status, reason = (status_line.rstrip("\r\n").split(" ", 2) + [""])[:3]
+        status = int(status)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').rstrip("\r\n")
+            if not line:
+                break
+            name, _sep, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while (await reader.readline()).strip():
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            content = b"".join(chunks)
+        elif 'content-length' in headers:
+            content = await reader.readexactly(int(headers['content-length']))
+        else:
+            content = await reader.read()
+
+        if status >= 300:
+            # redirections are not followed
+            raise HTTPError(status, reason, url)
+        return status, headers, content
@@ -0,0 +1,155 @@
+#!/usr/bin/env python2
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD 2014-2016
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+"""
+MIMEJSON bundles.
+
+A bundle stores a MIMEJSON document and its attached objects in a single file:
+
+    preamble   MAGIC, format version, length of the header (little endian, see PREAMBLE)
+    header     the MIMEJSON document, UTF-8 encoded JSON
+    padding    up to the next multiple of PAGE_SIZE
+    segments   the encoded objects, each one starting on a multiple of PAGE_SIZE
+
+Envelopes of objects stored in segments have an `$offset$` relative to the first segment,
+and a `$length$`.
+"""
+import os
+import shutil
+import struct
+import tempfile
+
+MAGIC = b"MIMEJSON"
+VERSION = 1
+PREAMBLE = struct.Struct("<8sHHQ")
+PAGE_SIZE = 4096
+
+
+def _align(n):
+    return (n + PAGE_SIZE - 1) // PAGE_SIZE * PAGE_SIZE
+
+
+class _Segment(object):
+
+    """
+    Write-only file appending a segment to a bundle.
+    """
+
+    def __init__(self, fp, offset):
+        self.fp = fp
+        self.offset = offset
+
+    def write(self, data):
+        return self.fp.write(data)
+
+    def tell(self):
+        return self.fp.tell() - self.offset
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def discard(self):
+        """
+        Remove the segment from the bundle.
+        """
+        self.fp.truncate(self.offset)
+
+
+class BundleWriter(object):
+
+    """
+    Collect the segments of a bundle, then write it.
+    """
+
+    def __init__(self):
+        """
+        Create a bundle writer, collecting the segments in a temporary file.
+        """
+        self._segments = tempfile.TemporaryFile()
+        self.cache = {}  # < objects stored in the bundle, see `MIMEJSON._encode_blob`
+
+    def open_segment(self):
+        """
+        Start a new segment.
+
+        :return: a file-like object, whose `offset` attribute is the offset of the segment
+        """
+        offset = _align(self._segments.seek(0, os.SEEK_END))
+        self._segments.seek(offset)
+        return _Segment(self._segments, offset)
+
+    def add_file(self, fp):
+        """
+        Copy a binary file in a new segment.
+
+        :return: the offset and the length of the segment
+        """
+        segment = self.open_segment()
+        shutil.copyfileobj(fp, segment, 1 << 20)
+        return segment.offset, segment.tell()
+
+    def write(self, fp, header):
+        """
+        Write the bundle.
+
+        :param fp: binary file-like object the bundle is written to
+        :param header: the encoded document, as bytes
+        """
+        fp.write(PREAMBLE.pack(MAGIC, VERSION, 0, len(header)))
+        fp.write(header)
+        fp.write(b"\0" * (_align(PREAMBLE.size + len(header)) - PREAMBLE.size - len(header)))
+        self._segments.seek(0)
+        shutil.copyfileobj(self._segments, fp, 1 << 20)
+
+    def close(self):
+        """
+        Remove the collected segments.
+        """
+        self._segments.close()
+
+
+def read_header(buf):
+    """
+    Parse the preamble of a bundle.
+
+    :param buf: the content of the bundle, a bytes-like object
+    :return: the encoded document as bytes and the offset of the first segment
+    """
+    magic, version, _flags, length = PREAMBLE.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("not a MIMEJSON bundle")
+    if version > VERSION:
+        raise ValueError("unsupported MIMEJSON bundle version %d" % (version,))
+    header = bytes(buf[PREAMBLE.size:PREAMBLE.size + length])
+    return header, _align(PREAMBLE.size + length)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python2
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD 2014-2016
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+"""
+On-disk cache of the remote objects of MIMEJSON documents.
+
+Each cached object is stored in a directory that can be shared by several processes:
+
+    <key>-<tag>    the content of the object, the key is the hash of its URL and the tag the hash
+                   of its ETag, or of its content when the server did not send one
+    <key>.json     the ETag and the name of the current content file of the URL
+
+Files are filled under a temporary name and renamed in place, content first, so that readers
+never see a partial entry. The modification time of content files records their last use, the
+least recently used ones are evicted when the cache grows over its size limit.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+
+_FILL_PREFIX = ".fill-"
+
+
+def _hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobCache(object):
+
+    """
+    Bounded cache of remote objects, keyed by URL and ETag.
+    """
+
+    def __init__(self, directory, max_size=1 << 30, revalidate=True):
+        """
+        Create or open a cache.
+
+        :param directory: directory of the cache, created if needed
+        :param max_size: size in bytes over which least recently used objects are evicted
+        :param revalidate: if True, cached objects are checked with a conditional request (If-None-Match)
+            before being used, otherwise they are used without a request
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.revalidate = revalidate
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+    def _key(self, url):
+        return _hash(url.encode("utf-8"))
+
+    def lookup(self, url):
+        """
+        Return the cached entry of an URL.
+
+        :return: (path of the content, ETag or None) tuple, or None if the URL is not cached
+        """
+        key = self._key(url)
+        try:
+            with open(os.path.join(self.directory, key + ".json")) as fp:
+                meta = json.load(fp)
+        except (IOError, ValueError):
+            return None
+        fn = os.path.join(self.directory, meta['blob'])
+        if not os.path.isfile(fn):
+            return None
+        return fn, meta['etag']
+
+    @contextlib.contextmanager
+    def open(self, transport, url, length=None):
+        """
+        Return the path of a local copy of a remote object, downloading it when needed.
+
+        The copy stays valid in the context. Objects larger than the cache are downloaded to
+        a temporary file removed when leaving the context.
+
+        :param transport: `HTTPTransport` used for the downloads
+        :param length: expected length of the object
+        """
+        entry = self.lookup(url)
+        if entry is not None and not self.revalidate:
+            self._touch(entry[0])
+            yield entry[0]
+            return
+
+        fd, tmp = tempfile.mkstemp(prefix=_FILL_PREFIX, dir=self.directory)
+        try:
+            with os.fdopen(fd, 'w+b') as fp:
+                size, etag = transport.download_if_modified(url, fp, length, entry[1] if entry else None)
+            if size is None:
+                self._touch(entry[0])
+                fn = entry[0]
+            elif size > self.max_size:
+                fn = tmp
+            else:
+                fn = self._fill(url, tmp, etag)
+            yield fn
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def _fill(self, url, tmp, etag):
+        """
+        Move a downloaded object in the cache, and evict the least recently used objects.
+        """
+        key = self._key(url)
+        if etag is not None:
+            tag = _hash(etag.encode("utf-8"))
+        else:
+            h = hashlib.sha256()
+            with open(tmp, 'rb') as fp:
+                for chunk in iter(lambda: fp.read(1 << 20), b""):
+                    h.update(chunk)
+            tag = h.hexdigest()
+        name = "%s-%s" % (key, tag[:32])
+        fn = os.path.join(self.directory, name)
+        os.replace(tmp, fn)
+
+        fd, meta = tempfile.mkstemp(prefix=_FILL_PREFIX, dir=self.directory)
+        with os.fdopen(fd, 'w') as fp:
+            json.dump({'url': url, 'etag': etag, 'blob': name}, fp)
+        os.replace(meta, os.path.join(self.directory, key + ".json"))
+
+        self.evict(keep=fn)
+        return fn
+
+    def _touch(self, fn):
+        try:
+            os.utime(fn)
+        except OSError:
+            pass
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used objects until the cache is under its size limit.
+
+        :param keep: path of an object never evicted
+        """
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for e in it:
+                if e.name.startswith(_FILL_PREFIX) or e.name.endswith(".json"):
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+        entries.sort()
+        for _mtime, size, fn in entries:
+            if total <= self.max_size:
+                break
+            if fn == keep:
+                continue
+            try:
+                os.unlink(fn)
+            except OSError:
+                continue
+            total -= size
+        return total
@@ -29,24 +29,95 @@
 # SUCH DAMAGE.
 # |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
 # ############################################################################
-import imp
+import collections.abc
+import importlib
 import logging
-import os
+
+from .lazy import LazyBlob
+from .mimetype import MANIFEST
+from .stats import span
+
+_JSON_SCALARS = frozenset((int, float, bool, str, bytes, type(None)))
+
+ENTRY_POINT_GROUP = "mimejson.codecs"
+
+
+def _qualified_name(cls):
+    return "%s.%s" % (cls.__module__, getattr(cls, '__qualname__', cls.__name__))
+
+
+def _entry_point_manifest():
+    """
+    Return the manifest entries declared by the `mimejson.codecs` entry points of installed packages.
+    """
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return []
+    eps = entry_points()
+    eps = eps.select(group=ENTRY_POINT_GROUP) if hasattr(eps, 'select') else eps.get(ENTRY_POINT_GROUP, ())
+    entries = []
+    for ep in eps:
+        try:
+            entry = ep.load()
+        except Exception:
+            logging.warning("mimejson: unable to load codec entry point %r", ep.name, exc_info=True)
+            continue
+        entries.extend([entry] if isinstance(entry, dict) else entry)
+    return entries
+
+
+class _CodecTable(collections.abc.Mapping):
+
+    """
+    Codecs indexed by mimetype, declared codecs being imported on first access.
+    """
+
+    def __init__(self, register):
+        self._register = register
+        self._codecs = {}
+
+    def __getitem__(self, mimetype):
+        codec = self._codecs.get(mimetype)
+        if codec is None:
+            entry = self._register._lazy_mimetypes.get(mimetype)
+            if entry is not None:
+                self._register._load_entry(entry)
+                codec = self._codecs.get(mimetype)
+        if codec is None:
+            raise KeyError(mimetype)
+        return codec
+
+    def __iter__(self):
+        return iter(set(self._codecs).union(self._register._lazy_mimetypes))
+
+    def __len__(self):
+        return len(set(self._codecs).union(self._register._lazy_mimetypes))
 
 
 class CodecRegister(object):
 
     """
     Register identifying CODECs that MIMEJSON may use.
+
+    Codecs are declared by manifest entries (see `mimejson.mimetype`) and imported lazily, or
+    registered directly with `register_codec`.
     """
 
     instance = None
+    instrumentation = None  # < `mimejson.stats.Instrumentation` measuring the imports of codec modules
 
     def __init__(self):
         """
         Initialize CODEC register.
         """
-        self.all_codecs = {}
+        self.all_codecs = _CodecTable(self)
+        self._typed = {}  # < python type -> codec, for codecs declaring `types`
+        self._predicates = []  # < codecs that can only be identified by `can_apply`
+        self._dispatch = {}  # < concrete class -> (typed codec, predicate codecs)
+        self._lazy_mimetypes = {}  # < mimetype -> manifest entry of a codec not imported yet
+        self._lazy_types = {}  # < qualified name of a type -> manifest entry of a codec not imported yet
+        self._lazy_predicates = []  # < manifest entries of predicate codecs not imported yet
 
     @classmethod
     def get_instance(cls):
@@ -57,68 +128,134 @@ class CodecRegister(object):
         """
         if cls.instance is None:
             cls.instance = CodecRegister()
-            paths = [
-                os.path.join(os.path.dirname(os.path.realpath(__file__)), "mimetype")
-            ]
-            for p in paths:
-                print(p)
-                cls.instance._load_codecs_from_directory(p)
+            cls.instance.add_manifest(MANIFEST)
+            cls.instance.add_manifest(_entry_point_manifest())
 
         return cls.instance
 
-    def _load_codecs_from_directory(self, path):
+    def add_manifest(self, entries):
         """
-        Load every codec mimetype from mimetype folder.
+        Declare codecs, imported when one of their types or mimetypes is met.
 
-        Codecs must be found in mimetype/codecs.py
-        with an Serializer class
+        :param entries: manifest entries, see `mimejson.mimetype`
         """
-        for f in os.listdir(path):
-            af = os.path.join(path, f)
-            if os.path.isdir(af) and os.path.exists(os.path.join(af, "__init__.py")):
-                try:
-                    e = self._load_codec_module(af, 'Serializer')
-                    if e is not None:
-                        self.register_codec(e)
-                except:
-                    logging.warning('mimejson: unable to load serialization module %r\n' % (af,))
-            elif f.endswith("py") and not f.startswith("__init__"):
-                try:
-                    e = self._load_codec_module(af, 'Serializer')
-                    if e is not None:
-                        self.register_codec(e)
-                except:
-                    logging.warning('mimejson: unable to load serialization module %r\n' % (af,))
-
-    def _load_codec_module(self, path, expected_class):
-        """
-        Return and load expected_class from path file.
+        for entry in entries:
+            for m in entry['mimetypes']:
+                self._lazy_mimetypes.setdefault(m, entry)
+            for t in entry.get('types', ()):
+                self._lazy_types.setdefault(t, entry)
+            if entry.get('predicate'):
+                self._lazy_predicates.append(entry)
+        self._dispatch = {}
+
+    def _load_entry(self, entry):
         """
-        if os.path.isfile(path):
-            mod_name, file_ext = os.path.splitext(os.path.basename(path))
-            if file_ext.lower() == '.py':
-                py_mod = imp.load_source(mod_name, path)
-            elif file_ext.lower() == '.pyc':
-                py_mod = imp.load_compiled(mod_name, path)
-        else:
-            mod_name = os.path.basename(path)
-            py_mod = imp.load_package(mod_name, path)
+        Import and register the codec of a manifest entry.
 
-        if hasattr(py_mod, expected_class):
-            return getattr(py_mod, expected_class)()
-        return None
+        Failures are logged, and not retried.
+        """
+        for m in entry['mimetypes']:
+            if self._lazy_mimetypes.get(m) is entry:
+                del self._lazy_mimetypes[m]
+        for t in entry.get('types', ()):
+            if self._lazy_types.get(t) is entry:
+                del self._lazy_types[t]
+        if entry in self._lazy_predicates:
+            self._lazy_predicates.remove(entry)
+        try:
+            with span(self.instrumentation, 'codec.import', entry['module']):
+                module = importlib.import_module(entry['module'])
+                codec = getattr(module, entry.get('codec', 'Serializer'))()
+        except Exception:
+            logging.warning("mimejson: unable to load codec module %r", entry['module'], exc_info=True)
+            return None
+        # codecs declared first for a type remain its default codec
+        for t in getattr(codec, "types", None) or ():
+            other = self._lazy_types.get(_qualified_name(t))
+            if other is not None:
+                self._load_entry(other)
+        self.register_codec(codec)
+        return codec
 
     def register_codec(self, codec):
         """
         Add codec to the list of register codecs.
 
         mimetype can be string or tuple of string.
+
+        Codecs may declare a `types` tuple of python classes they handle, in which case they
+        are dispatched by type (subclasses included). Codecs without `types` are dispatched
+        by calling their `can_apply` predicate.
         """
         if isinstance(codec.mimetype, tuple):
             for m in codec.mimetype:
-                self.all_codecs[m] = codec
+                self.all_codecs._codecs[m] = codec
         else:
-            self.all_codecs[codec.mimetype] = codec
+            self.all_codecs._codecs[codec.mimetype] = codec
+
+        types = getattr(codec, "types", None)
+        if types:
+            for t in types:
+                self._typed.setdefault(t, codec)
+        elif codec not in self._predicates:
+            self._predicates.append(codec)
+        self._dispatch = {}
+
+    def _resolve(self, cls, prefer=()):
+        """
+        Compute the dispatch entry of a concrete class.
+
+        The first class of the MRO with a typed codec wins, declared codecs of the classes of the MRO
+        being imported on the way. Predicate-only codecs are not consulted for plain JSON scalars, nor for
+        `LazyBlob` proxies, which they would decode.
+
+        :param prefer: mimetypes of codecs chosen over the other codecs of the same types
+        """
+        preferred = []
+        for m in prefer:
+            codec = self.all_codecs.get(m)
+            if codec is not None and getattr(codec, "types", None) and codec not in preferred:
+                preferred.append(codec)
+
+        typed = None
+        for base in cls.__mro__:
+            for codec in preferred:
+                if base in codec.types:
+                    return codec, ()
+            if base not in self._typed and self._lazy_types:
+                entry = self._lazy_types.get(_qualified_name(base))
+                if entry is not None:
+                    self._load_entry(entry)
+            if base in self._typed:
+                typed = self._typed[base]
+                break
+        if cls in _JSON_SCALARS or cls is LazyBlob:
+            return typed, ()
+        if typed is None:
+            for entry in list(self._lazy_predicates):
+                self._load_entry(entry)
+        return typed, tuple(self._predicates)
+
+    def lookup(self, obj, prefer=()):
+        """
+        Return the codec to be used to encode obj.
+
+        :param obj: the object to be encoded
+        :param prefer: tuple of mimetypes of codecs chosen over the other codecs of the same types
+        :return: the codec or None if obj does not need to be encoded by a codec
+        """
+        cls = type(obj)
+        key = (cls, prefer) if prefer else cls
+        try:
+            typed, predicates = self._dispatch[key]
+        except KeyError:
+            typed, predicates = self._dispatch[key] = self._resolve(cls, prefer)
+        if typed is not None:
+            return typed
+        for codec in predicates:
+            if codec.can_apply(obj):
+                return codec
+        return None
 
     def __getitem__(self, item):
         return self.all_codecs[item]
@@ -0,0 +1,218 @@
+#!/usr/bin/env python2
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD 2014-2016
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+"""
+JSON backends of MIMEJSON serialisers.
+
+A backend provides `dumps` (to str), `dumpb` (to UTF-8 bytes), `loads` (from str or bytes), and the
+`separators` (item separator, key separator) of its output, used by `MIMEJSON.iterencode`. The
+standard library is the default backend, faster engines are used when they are installed and chosen:
+
+    json        standard library
+    orjson      orjson, encodes straight to bytes
+    ujson       UltraJSON
+    simdjson    pysimdjson, for parsing, documents are encoded by the standard library
+
+Backends parse each other's output, but their output differs in whitespace and escaping of
+non-ASCII characters, and on values outside of JSON: orjson encodes NaN and infinities as null, and
+rejects integers that do not fit in 64 bits.
+"""
+import json
+
+
+class StdlibJSON(object):
+
+    """
+    JSON backend of the standard library.
+    """
+
+    name = 'json'
+    separators = (', ', ': ')
+
+    def dumps(self, obj):
+        """
+        Encode an object as a JSON string.
+        """
+        return json.dumps(obj)
+
+    def dumpb(self, obj):
+        """
+        Encode an object as JSON, in UTF-8 bytes.
+        """
+        return json.dumps(obj).encode('utf-8')
+
+    def loads(self, data):
+        """
+        Parse a JSON string or UTF-8 bytes.
+        """
+        return json.loads(data)
+
+
+class OrjsonJSON(object):
+
+    """
+    JSON backend of orjson.
+    """
+
+    name = 'orjson'
+    separators = (',', ':')
+
+    def __init__(self):
+        """
+        Import orjson, raising ImportError if it is not installed.
+        """
+        import orjson
+        self._dumps = orjson.dumps
+        self._loads = orjson.loads
+        self._option = orjson.OPT_NON_STR_KEYS  # < keys converted to strings, as by the standard library
+
+    def dumps(self, obj):
+        """
+        Encode an object as a JSON string.
+        """
+        return self._dumps(obj, option=self._option).decode('utf-8')
+
+    def dumpb(self, obj):
+        """
+        Encode an object as JSON, in UTF-8 bytes.
+        """
+        return self._dumps(obj, option=self._option)
+
+    def loads(self, data):
+        """
+        Parse a JSON string or UTF-8 bytes.
+        """
+        return self._loads(data)
+
+
+class UjsonJSON(object):
+
+    """
+    JSON backend of UltraJSON.
+    """
+
+    name = 'ujson'
+    separators = (',', ':')
+
+    def __init__(self):
+        """
+        Import UltraJSON, raising ImportError if it is not installed.
+        """
+        import ujson
+        self._dumps = ujson.dumps
+        self._loads = ujson.loads
+
+    def dumps(self, obj):
+        """
+        Encode an object as a JSON string.
+        """
+        return self._dumps(obj)
+
+    def dumpb(self, obj):
+        """
+        Encode an object as JSON, in UTF-8 bytes.
+        """
+        return self._dumps(obj).encode('utf-8')
+
+    def loads(self, data):
+        """
+        Parse a JSON string or UTF-8 bytes.
+        """
+        return self._loads(data)
+
+
+class SimdjsonJSON(StdlibJSON):
+
+    """
+    JSON backend parsing with pysimdjson, and encoding with the standard library.
+    """
+
+    name = 'simdjson'
+
+    def __init__(self):
+        """
+        Import pysimdjson, raising ImportError if it is not installed.
+        """
+        import simdjson
+        self._loads = simdjson.loads
+
+    def loads(self, data):
+        """
+        Parse a JSON string or UTF-8 bytes.
+        """
+        return self._loads(data)
+
+
+BACKENDS = {
+    'json': StdlibJSON,
+    'orjson': OrjsonJSON,
+    'ujson': UjsonJSON,
+    'simdjson': SimdjsonJSON,
+}
+
+AUTO_ORDER = ('orjson', 'simdjson', 'ujson', 'json')  # < backends tried by 'auto', fastest first
+
+
+def available_backends():
+    """
+    Return the names of the backends whose engine is installed.
+    """
+    ret = []
+    for name in AUTO_ORDER:
+        try:
+            BACKENDS[name]()
+        except ImportError:
+            continue
+        ret.append(name)
+    return ret
+
+
+def get_backend(backend=None):
+    """
+    Return a JSON backend.
+
+    :param backend: None or 'json' for the standard library, the name of another backend, 'auto' for the
+        fastest backend installed, or a backend object, returned as is
+    :raise ImportError: if the engine of a named backend is not installed
+    """
+    if backend is None:
+        return StdlibJSON()
+    if not isinstance(backend, str):
+        return backend
+    if backend == 'auto':
+        for name in AUTO_ORDER:
+            try:
+                return BACKENDS[name]()
+            except ImportError:
+                continue
+    if backend not in BACKENDS:
+        raise ValueError("mimejson: unknown JSON backend %r" % (backend,))
+    return BACKENDS[backend]()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python2
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD 2014-2016
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+"""
+Lazy loading of the objects attached to MIMEJSON documents.
+"""
+import operator
+
+_UNSET = object()
+
+
+class LazyBlob(object):
+
+    """
+    Proxy to an object attached to a MIMEJSON document, decoded on first access.
+
+    The fields of the envelope (`$mimetype$`, `$length$`...) are available without decoding.
+    Any other access is forwarded to the decoded object: attributes, items, iteration, and arithmetic,
+    comparison and conversion operators. In-place operators rebind the name to the result.
+    """
+
+    __slots__ = ('envelope', '_loader', '_value')
+
+    def __init__(self, envelope, loader):
+        """
+        Create a proxy.
+
+        :param envelope: the MIMEJSON envelope of the object
+        :param loader: function decoding the object from its envelope
+        """
+        self.envelope = envelope
+        self._loader = loader
+        self._value = _UNSET
+
+    @property
+    def mimetype(self):
+        """
+        Return the mimetype of the object, from its envelope.
+        """
+        return self.envelope['$mimetype$']
+
+    @property
+    def length(self):
+        """
+        Return the length of the encoded object, from its envelope.
+        """
+        return self.envelope.get('$length$')
+
+    @property
+    def materialized(self):
+        """
+        Return True if the object has been decoded.
+        """
+        return self._value is not _UNSET
+
+    def materialize(self):
+        """
+        Decode the object if needed.
+
+        :return: the decoded object
+        """
+        if self._value is _UNSET:
+            self._value = self._loader(self.envelope)
+            self._loader = None
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self.materialize(), name)
+
+    def __getitem__(self, item):
+        if isinstance(item, str) and item in self.envelope:
+            return self.envelope[item]
+        return self.materialize()[item]
+
+    def __setitem__(self, item, value):
+        self.materialize()[item] = value
+
+    def __delitem__(self, item):
+        del self.materialize()[item]
+
+    def __contains__(self, item):
+        return item in self.materialize()
+
+    def __len__(self):
+        return len(self.materialize())
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __reversed__(self):
+        return reversed(self.materialize())
+
+    def __hash__(self):
+        return hash(self.materialize())
+
+    def __array__(self, *args, **kwargs):
+        return self.materialize().__array__(*args, **kwargs)
+
+    def __repr__(self):
+        if self.materialized:
+            return repr(self._value)
+        return "<LazyBlob %s (%s bytes)>" % (self.mimetype, self.length)
+
+
+def _forward(fct):
+    def method(self, *args):
+        return fct(self.materialize(), *args)
+    return method
+
+
+def _forward_reflected(fct):
+    def method(self, other):
+        return fct(other, self.materialize())
+    return method
+
+
+for _name in ('add', 'sub', 'mul', 'matmul', 'truediv', 'floordiv', 'mod', 'pow', 'lshift', 'rshift', 'and', 'xor',
+              'or'):
+    _fct = getattr(operator, _name + '_' if _name in ('and', 'or') else _name)
+    setattr(LazyBlob, '__%s__' % (_name,), _forward(_fct))
+    setattr(LazyBlob, '__r%s__' % (_name,), _forward_reflected(_fct))
+for _name in ('lt', 'le', 'eq', 'ne', 'gt', 'ge', 'neg', 'pos', 'abs', 'invert', 'index'):
+    setattr(LazyBlob, '__%s__' % (_name,), _forward(getattr(operator, _name)))
+for _name, _fct in (('bool', bool), ('int', int), ('float', float), ('complex', complex), ('divmod', divmod),
+                    ('round', round)):
+    setattr(LazyBlob, '__%s__' % (_name,), _forward(_fct))
+LazyBlob.__rdivmod__ = _forward_reflected(divmod)
+del _name, _fct
@@ -42,62 +42,360 @@ It is designed to
    4. to be easy to implement in any language
 """
 
-import errno
-import json
+import asyncio
+import base64
+import concurrent.futures
+import functools
+import hashlib
+import io
+import itertools
 import logging
+import mmap
 import os
 import os.path
 import sys
+import tempfile
+import time
+import weakref
 
 import requests
+import requests.adapters
+import urllib3.util.retry
 
+from .aio import AsyncHTTPTransport
+from .bundle import BundleWriter, read_header
+from .cache import BlobCache
 from .codec import CodecRegister
+from .jsonlib import get_backend
+from .lazy import LazyBlob
+from .multipart import CHUNK_SIZE, MultipartBody
+from .stats import Instrumentation, nbytes, span
+from .storage import DirectoryStorage, Storage
 
-if sys.version_info >= (3, 0):
-    JSON_ATOMS = (int, str, bytes, bool, float)
-else:
-    JSON_ATOMS = (int, str, unicode, bool, float)
+JSON_ATOMS = (int, str, bytes, bool, float)
+STRING_TYPES = (str, bytes)
+
+_CONTAINERS = frozenset((list, dict, tuple))
 
 #
 # utility functions
 #
 
 
-def _xmap(obj, fct, key=None):
+def _xmap(obj, fct, path=()):
+    """
+    Map function to deep transform an object.
+
+    The tree is walked iteratively (deep documents do not hit the recursion limit) and in
+    post-order: fct is applied to the leaves, then to the containers built from the
+    transformed leaves. Containers for which fct did not change any descendant are not
+    copied, the original container is passed to fct instead.
+
+    :param obj: the object to be transformed
+    :param fct: the function to be applied, called as fct(obj, path=path), path being a `_Path`
+    :param path: the location of obj, a tuple of dict keys and sequence indices
+    :raise ValueError: if a container contains itself
+    """
+    path = _Path.of(path)
+    if type(obj) not in _CONTAINERS:
+        return fct(obj, path=path)
+
+    result = None
+    stack = [_XmapFrame(obj, path)]
+    walked = {id(obj)}  # < ids of the containers on the stack
+    while stack:
+        frame = stack[-1]
+        for k, item in frame.items:
+            if type(item) in _CONTAINERS:
+                if id(item) in walked:
+                    raise ValueError("Circular reference detected")
+                walked.add(id(item))
+                stack.append(_XmapFrame(item, _Path(frame.path, k)))
+                break
+            value = fct(item, path=_Path(frame.path, k))
+            if value is not item:
+                frame.change(k, value)
+        else:
+            stack.pop()
+            walked.discard(id(frame.obj))
+            value = fct(frame.build(), path=frame.path)
+            if not stack:
+                result = value
+            elif value is not frame.obj:
+                stack[-1].change(frame.path.key, value)
+    return result
+
+
+class _Path(object):
+
+    """
+    Location of an object walked by `_xmap`, a key and the location of its parent.
+
+    Locations are iterated over as, and converted by `tuple` to, the tuple of dict keys and sequence
+    indices leading to the object, which is only built when needed.
+    """
+
+    __slots__ = ('parent', 'key')
+
+    def __init__(self, parent, key):
+        self.parent = parent
+        self.key = key
+
+    @classmethod
+    def of(cls, path):
+        """
+        Return the location of a tuple of keys.
+        """
+        if type(path) is cls:
+            return path
+        ret = _ROOT
+        for k in path:
+            ret = cls(ret, k)
+        return ret
+
+    def __bool__(self):
+        return self.parent is not None
+
+    def __iter__(self):
+        keys = []
+        node = self
+        while node.parent is not None:
+            keys.append(node.key)
+            node = node.parent
+        return reversed(keys)
+
+    def __repr__(self):
+        return "_Path(%r)" % (tuple(self),)
+
+
+_ROOT = _Path(None, None)
+
+
+class _XmapFrame(object):
+
+    """
+    Container being walked by `_xmap`, with the children changed by the function.
+    """
+
+    __slots__ = ('obj', 'path', 'items', 'changes')
+
+    def __init__(self, obj, path):
+        self.obj = obj
+        self.path = path
+        self.items = iter(obj.items()) if type(obj) is dict else enumerate(obj)
+        self.changes = None
+
+    def change(self, key, value):
+        if self.changes is None:
+            self.changes = []
+        self.changes.append((key, value))
+
+    def build(self):
+        if self.changes is None:
+            return self.obj
+        if type(self.obj) is dict:
+            ret = dict(self.obj)
+            ret.update(self.changes)
+            return ret
+        ret = list(self.obj)
+        for k, v in self.changes:
+            ret[k] = v
+        return ret if type(self.obj) is list else type(self.obj)(ret)
+
+
+def _part_name(path, parts=()):
+    """
+    Return the name of the multipart part holding the object found at path.
+
+    Values of dicts are sent under their key, as they always were. Items of sequences, and values whose
+    key is already the name of a part, are sent under their path: its keys joined by dots.
+
+    :param path: the location of the object, a non empty `_Path`
+    :param parts: the names of the parts already registered
+    """
+    if isinstance(path.key, str) and path.key not in parts:
+        return path.key
+    return ".".join(str(k) for k in path)
+
+
+def _batches(iterable, size):
+    """
+    Split an iterable in lists of at most size items.
+    """
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _json_key(key, encode):
     """
-    Recursive map function to deep transform an object.
+    Return the JSON representation of a dict key, as `json.dumps` does.
+
+    :param key: the dict key
+    :param encode: the JSON encoding function
+    """
+    if isinstance(key, STRING_TYPES):
+        return encode(key)
+    if key is None or isinstance(key, (int, float)):
+        return encode(encode(key))
+    raise TypeError("keys must be str, int, float, bool or None, not %s" % (type(key).__name__,))
+
+
+class _SpillFile(object):
+
+    """
+    Binary file written in memory until its size reaches a threshold, then spilled to a file.
+    """
+
+    def __init__(self, threshold, opener):
+        """
+        Create a spill file.
+
+        :param threshold: size from which data are spilled
+        :param opener: function returning the binary file data are spilled to
+        """
+        self.threshold = threshold
+        self.opener = opener
+        self.file = None
+        self._buffer = io.BytesIO()
+
+    @property
+    def inline(self):
+        return self.file is None
+
+    def _spill(self):
+        self.file = self.opener()
+        self.file.write(self._buffer.getvalue())
+        self._buffer = None
+
+    def write(self, data):
+        if self.file is None and self._buffer.tell() + memoryview(data).nbytes >= self.threshold:
+            self._spill()
+        return (self.file or self._buffer).write(data)
+
+    def tell(self):
+        return (self.file or self._buffer).tell()
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return self._buffer.getvalue()
+
+    def close(self):
+        if self.file is None and self._buffer.tell() >= self.threshold:
+            self._spill()
+        if self.file is not None:
+            self.file.close()
 
-    :param object: the name of the object to be transformed
-    :param fct: the function to be applied
-    :param key: an indication for the function on the location of the object processed (FIXME: check needed)
+    def discard(self):
+        """
+        Drop the data written, without spilling them, and discard the file they were spilled to if it has
+        a `discard` method, closing it otherwise.
+        """
+        self._buffer = None
+        if self.file is not None:
+            getattr(self.file, 'discard', self.file.close)()
+
+
+class _Pending(object):
+
+    """
+    Placeholder of an object being encoded or decoded in an executor.
     """
-    if type(obj) in [list, dict, tuple]:
-        if isinstance(obj, list):
-            obj = [_xmap(item, fct) for item in obj]
-        elif isinstance(obj, dict):
-            obj = dict([
-                (k, _xmap(v, fct, key=k))
-                for k, v in obj.items()
-            ])
-        elif isinstance(obj, tuple):
-            obj = tuple([_xmap(item, fct) for item in obj])
-    return fct(obj, key=key)
-
-
-def _mkdir_p(path):
+
+    __slots__ = ('future',)
+
+    def __init__(self, future):
+        self.future = future
+
+
+class _ContentAddressedFile(object):
+
     """
-    Reproduce `mkdir -p` behaviour.
+    Binary file named after the hash of its content once closed.
 
-    :param path: path to be created
-    :return: none
+    Files whose content is already stored are discarded.
     """
-    try:
-        os.makedirs(path)
-    except OSError as exc:
-        if exc.errno == errno.EEXIST and os.path.isdir(path):
-            pass
+
+    def __init__(self, storage, extension=''):
+        self.storage = storage
+        self.extension = extension
+        self.name = None
+        self._tmp = "." + storage.new_name('.part')
+        self._file = storage.open(self._tmp, 'wb')
+        self._hash = hashlib.sha256()
+
+    def write(self, data):
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._file.close()
+        name = self._hash.hexdigest() + self.extension
+        if self.storage.exists(name):
+            self.storage.delete(self._tmp)
         else:
-            raise
+            self.storage.rename(self._tmp, name)
+        self.name = self.storage.location(name)
+
+    def discard(self):
+        self._file.close()
+        self.storage.delete(self._tmp)
+
+
+_INLINE_ENCODINGS = {
+    'base64': (base64.b64encode, base64.b64decode),
+    'base85': (base64.b85encode, base64.b85decode),
+}
+
+
+class _BufferSink(object):
+
+    """
+    Download destination in memory.
+    """
+
+    def __init__(self, size):
+        self.buf = bytearray(size)
+
+    def resize(self, size):
+        if size > len(self.buf):
+            self.buf.extend(bytes(size - len(self.buf)))
+        else:
+            del self.buf[size:]
+
+    def write_at(self, offset, data):
+        end = offset + len(data)
+        if end > len(self.buf):
+            self.resize(end)
+        self.buf[offset:end] = data
+
+
+class _FileSink(object):
+
+    """
+    Download destination in a file.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.fd = fp.fileno()
+
+    def resize(self, size):
+        self.fp.truncate(size)
+
+    def write_at(self, offset, data):
+        os.pwrite(self.fd, data, offset)
 
 
 class HTTPTransport(object):
@@ -106,29 +404,80 @@ class HTTPTransport(object):
     Responsible for storing data/pulling on servers after serialization/deserialization.
     """
 
-    def __init__(self, server, user=None, password=None, session=None):
+    def __init__(self, server, user=None, password=None, session=None, pool_connections=10, pool_maxsize=10,
+                 timeout=None, retries=3, backoff_factor=0.5, chunked=False, range_threshold=1 << 26,
+                 range_size=1 << 24, range_workers=4, instrumentation=None, json_backend=None):
         """
         Create a HTTP transport for MIMEJSON.
+
+        Unless a session is given, the transport owns a session keeping connections alive, with at
+        most pool_maxsize connections per host and retrying idempotent requests with exponential backoff.
+        A transport can be shared by several MIMEJSON instances.
+
+        :param pool_connections: number of hosts for which connections are kept
+        :param pool_maxsize: maximum number of connections to a host
+        :param timeout: timeout in seconds of requests, or (connect timeout, read timeout) tuple
+        :param retries: number of retries of failed connections and idempotent requests
+        :param backoff_factor: factor of the exponential backoff between retries
+        :param chunked: if True, queries are sent with chunked transfer encoding instead of a Content-Length
+        :param range_threshold: size from which content is downloaded with parallel range requests
+        :param range_size: size of the range requests
+        :param range_workers: number of range requests in flight for a download
+        :param instrumentation: `mimejson.stats.Instrumentation` measuring uploads and downloads
+        :param json_backend: JSON backend encoding the fields of queries and parsing responses, see
+            `mimejson.jsonlib.get_backend`
         """
         self.url = server
-        self.session = session or requests
+        self.instrumentation = instrumentation
+        self.json = get_backend(json_backend)
+        self.timeout = timeout
+        self.chunked = chunked
+        self.range_threshold = range_threshold
+        self.range_size = range_size
+        self.range_workers = range_workers
+        self._own_session = session is None
+        if session is None:
+            session = requests.Session()
+            retry = urllib3.util.retry.Retry(total=retries, backoff_factor=backoff_factor,
+                                             status_forcelist=(429, 502, 503, 504))
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                                    pool_block=True, max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+        self.kwargs = {'timeout': timeout}
         if user:
-            self.kwargs = dict(auth=(user, password))
-        else:
-            self.kwargs = {}
+            self.kwargs['auth'] = (user, password)
+
+    def close(self):
+        """
+        Close the connections of the session owned by the transport.
+        """
+        if self._own_session:
+            self.session.close()
 
     def send(self, files, data, url=None):
         """
         Send file to a remote location using the transport.
 
-        :param: files to be sent
+        The multipart body is streamed from the files, it is never held in memory.
+
+        :param: files to be sent, files or (file, length) tuples indexed by part name
         :data: payload
         """
         target_url = self.url
         if url:
             target_url = url
-        res = self.session.post(target_url, files=files, data=data, **self.kwargs)
-        return json.loads(res.text)
+        fields = dict((k, v if isinstance(v, STRING_TYPES) else self.json.dumpb(v))
+                      for k, v in (data or {}).items())
+        body = MultipartBody(fields, files)
+        headers = {'Content-Type': body.content_type}
+        with span(self.instrumentation, 'transport', 'upload') as s:
+            res = self.session.post(target_url, data=iter(body) if self.chunked else body, headers=headers,
+                                    **self.kwargs)
+            s.bytes_out = len(body)
+            s.bytes_in = len(res.content)
+        return self.json.loads(res.content)
 
     def get(self, url):
         """
@@ -137,7 +486,133 @@ class HTTPTransport(object):
         :param: files to be sent
         :data: payload
         """
-        return self.session.get(url, **self.kwargs).content
+        with span(self.instrumentation, 'transport', 'download') as s:
+            content = self.session.get(url, **self.kwargs).content
+            s.bytes_in = len(content)
+        return content
+
+    def get_range(self, url, offset, length):
+        """
+        Receive a range of the content of a remote location.
+
+        :param offset: offset of the range
+        :param length: length of the range
+        :return: the content of the range, as bytes
+        """
+        if length <= 0:
+            return b""
+        headers = {'Range': "bytes=%d-%d" % (offset, offset + length - 1), 'Accept-Encoding': 'identity'}
+        with span(self.instrumentation, 'transport', 'download') as s:
+            res = self.session.get(url, headers=headers, **self.kwargs)
+            res.raise_for_status()
+            s.bytes_in = len(res.content)
+        if res.status_code != 206:
+            # the server does not support range requests
+            return res.content[offset:offset + length]
+        return res.content
+
+    def fetch(self, url, length=None):
+        """
+        Receive content from a remote location in memory.
+
+        :param length: expected length of the content, used to allocate the buffer up front
+        :return: the content as a bytearray
+        """
+        sink = _BufferSink(length or 0)
+        sink.resize(self._download(url, sink, length)[0])
+        return sink.buf
+
+    def download(self, url, fp, length=None):
+        """
+        Receive content from a remote location into a binary file.
+
+        :param fp: binary file object, with a file descriptor
+        :param length: expected length of the content, used to allocate the file up front
+        :return: the length of the content
+        """
+        return self.download_if_modified(url, fp, length)[0]
+
+    def download_if_modified(self, url, fp, length=None, etag=None):
+        """
+        Receive content from a remote location into a binary file, unless it matches an ETag.
+
+        :param fp: binary file object, with a file descriptor
+        :param length: expected length of the content, used to allocate the file up front
+        :param etag: ETag of a copy of the content, sent as If-None-Match
+        :return: (length of the content or None if it was not modified, ETag of the content) tuple
+        """
+        sink = _FileSink(fp)
+        if length:
+            sink.resize(length)
+        size, etag = self._download(url, sink, length, etag)
+        sink.resize(size or 0)
+        return size, etag
+
+    def _download(self, url, sink, length=None, etag=None):
+        """
+        Stream content from a remote location to a sink, measured by the instrumentation.
+        """
+        with span(self.instrumentation, 'transport', 'download') as s:
+            size, etag = self._download_ranges(url, sink, length, etag)
+            s.bytes_in = size or 0
+        return size, etag
+
+    def _download_ranges(self, url, sink, length=None, etag=None):
+        """
+        Stream content from a remote location to a sink.
+
+        Content of at least `range_threshold` bytes is downloaded with parallel range requests when the
+        server supports them (its response to the first range request is then a 206).
+
+        :param sink: object with `write_at(offset, data)` and `resize(size)` methods
+        :param etag: if given, the request is conditional on the content not matching this ETag
+        :return: (length of the content or None if it was not modified, ETag of the content) tuple
+        """
+        headers = {'Accept-Encoding': 'identity'}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if length is not None and length >= self.range_threshold:
+            headers['Range'] = "bytes=0-%d" % (self.range_size - 1,)
+        total, res = self._download_range(url, sink, headers)
+        if res.status_code == 304:
+            return None, etag
+        etag = res.headers.get('ETag')
+        if res.status_code != 206 or total <= self.range_size:
+            return total, etag
+
+        sink.resize(total)
+
+        def _fetch(start):
+            end = min(start + self.range_size, total) - 1
+            self._download_range(url, sink, {'Accept-Encoding': 'identity', 'Range': "bytes=%d-%d" % (start, end)})
+
+        with concurrent.futures.ThreadPoolExecutor(self.range_workers) as pool:
+            for _ in pool.map(_fetch, range(self.range_size, total, self.range_size)):
+                pass
+        return total, etag
+
+    def _download_range(self, url, sink, headers):
+        """
+        Stream a response to a sink.
+
+        :return: (total length of the content for partial responses or length of the response otherwise,
+            response) tuple
+        """
+        res = self.session.get(url, headers=headers, stream=True, **self.kwargs)
+        try:
+            res.raise_for_status()
+            pos = 0
+            if res.status_code == 206:
+                content_range = res.headers['Content-Range'].split(" ", 1)[1]
+                pos = int(content_range.split("-", 1)[0])
+            for chunk in res.iter_content(CHUNK_SIZE):
+                sink.write_at(pos, chunk)
+                pos += len(chunk)
+        finally:
+            res.close()
+        if res.status_code == 206:
+            return int(content_range.rsplit("/", 1)[1]), res
+        return pos, res
 
 
 class MIMEJSON(object):
@@ -146,75 +621,535 @@ class MIMEJSON(object):
     MIMEJSON Serialization Manager.
 
     FILE: This implementation is naive and uses a temporary storage for all the data that have to be transmitted
-    TODO: make upload async and parallel
     """
 
-    def __init__(self, server=None, user=None, password=None, basepath=None, use_tmp_storage=None, session=None):
+    memory_download_limit = 1 << 26  # < size up to which remote objects are downloaded in memory
+
+    def __init__(self, server=None, user=None, password=None, basepath=None, use_tmp_storage=None, session=None,
+                 codec_options=None, inline_threshold=0, inline_encoding='base64', content_addressed=False,
+                 executor=None, workers=None, transport=None, async_transport=None, cache=None, storage=None,
+                 prefer=None, instrumentation=None, json_backend=None):
         """
         Initialise the MIMEJSON serialiser.
 
         If no arguments given the decode will not send to the server.
         you can change those following variable after init.
+
+        :param codec_options: dict of keyword arguments passed to the codecs, indexed by mimetype
+        :param inline_threshold: size in bytes under which encoded objects are embedded in the JSON
+            document instead of being stored, either an int or a dict of int indexed by mimetype
+        :param inline_encoding: 'base64' or 'base85', encoding of the embedded objects
+        :param content_addressed: if True, objects are stored once, under the hash of their encoded form,
+            and objects already stored by this serialiser are not encoded again (see `_encode_blob`)
+        :param executor: a `concurrent.futures.ThreadPoolExecutor` used to encode and decode objects
+            concurrently. Process pools are not supported: the codecs share the storage, the caches and the
+            instrumentation of the serialiser, which cannot be sent to other processes.
+        :param workers: number of threads of the executor created when no executor is given
+        :param transport: `HTTPTransport` to be used, instead of creating one for server. Transports created
+            by the serialiser are closed on exit, the ones given are left open.
+        :param async_transport: `mimejson.aio.AsyncHTTPTransport` to be used, instead of creating one for server
+        :param cache: `mimejson.cache.BlobCache`, or its directory, keeping the remote objects of loaded documents
+        :param storage: `mimejson.storage.Storage` of the encoded objects, or the path of their directory,
+            instead of a directory storage in basepath, or in a temporary directory when use_tmp_storage is
+            True (the default). The `storage` attribute accepts the same values.
+        :param prefer: mimetypes of codecs used to encode objects instead of the default codecs of
+            their types, for instance ('application/x-npy-compressed',) to compress arrays
+        :param instrumentation: `mimejson.stats.Instrumentation` measuring codecs, walks, JSON and the
+            transports created for server, or True to create one. See `stats`. Codec modules are imported
+            once per process, by the shared `CodecRegister`: their imports are measured by the first
+            instrumented serialiser, until it exits, unless the register has an instrumentation already.
+        :param json_backend: JSON backend of the documents and of the transports created for server: None
+            for the standard library, 'orjson', 'ujson', 'simdjson', or 'auto' for the fastest one installed.
+            See `jsonlib`.
         """
+        if instrumentation is True:
+            instrumentation = Instrumentation()
+        self.instrumentation = instrumentation
+        self.json = get_backend(json_backend)
         self.codecs = CodecRegister.get_instance()
+        self._own_codec_instrumentation = instrumentation is not None and self.codecs.instrumentation is None
+        if self._own_codec_instrumentation:
+            self.codecs.instrumentation = instrumentation
+        self.codec_options = codec_options or {}
+        self.prefer = tuple(prefer or ())
+        self.inline_threshold = inline_threshold
+        self.inline_encoding = inline_encoding
+        self.content_addressed = content_addressed
+        self._blob_cache = {}  # < digest or id of stored objects -> (weakref or None, envelope)
 
-        self.storage = os.getcwd()
+        if executor is not None and not isinstance(executor, concurrent.futures.ThreadPoolExecutor):
+            raise TypeError("mimejson: executor must be a ThreadPoolExecutor, not %s" % (type(executor).__name__,))
+        self.executor = executor
+        self.workers = workers
+        self._own_executor = executor is None and bool(workers)
+        if self._own_executor:
+            self.executor = concurrent.futures.ThreadPoolExecutor(workers)
 
-        if basepath:
-            self.storage = basepath
+        if storage is not None:
             use_tmp_storage = False
+        else:
+            directory = os.getcwd()
 
-        if use_tmp_storage is None:
-            use_tmp_storage = True
+            if basepath:
+                directory = basepath
+                use_tmp_storage = False
 
-        if use_tmp_storage:
-            self.storage = os.path.join("/tmp", ".mjson-" + str(os.getpid()))
+            if use_tmp_storage is None:
+                use_tmp_storage = True
 
+            if use_tmp_storage:
+                directory = os.path.join("/tmp", ".mjson-" + str(os.getpid()))
+            storage = DirectoryStorage(directory, temporary=use_tmp_storage)
+
+        self.storage = storage
         self.using_tmp_storage = use_tmp_storage
 
-        self.transport = None
+        self.transport = transport
+        self.async_transport = async_transport
+        self._own_transport = server is not None and transport is None
+        if isinstance(cache, STRING_TYPES):
+            cache = BlobCache(cache)
+        self.cache = cache
 
-        self._objects = {}  # < temporaries (bad design to be removed)
+        if server is not None:
+            if transport is None:
+                self.transport = HTTPTransport(server, user, password, session, instrumentation=instrumentation,
+                                               json_backend=self.json)
+            if async_transport is None:
+                self.async_transport = AsyncHTTPTransport(server, user, password, instrumentation=instrumentation,
+                                                          json_backend=self.json)
 
-        if server is not None and user is not None and password is not None:
-            self.transport = HTTPTransport(server, user, password, session)
+    @property
+    def storage(self):
+        """
+        Return the `mimejson.storage.Storage` of the encoded objects.
+        """
+        return self._storage
 
-    def __mimejson_encode_item(self, obj, key):
-        ret = obj
-        for mc in self.codecs.all_codecs.items():
-            can_apply = mc[1].can_apply
-            if can_apply(obj):
-                ret = mc[1].encode(obj, self.storage)
+    @storage.setter
+    def storage(self, storage):
+        """
+        Set the storage of the encoded objects, a path being the one of a `mimejson.storage.DirectoryStorage`.
 
-                # store encoded file for future transmission
-                if key is not None and '$path$' in ret:
-                    c = self.codecs['file']
-                    self._objects[key] = c.decode(ret, ret['$path$'])
+        A directory set after entering the serialiser is not created by it.
+        """
+        if not isinstance(storage, Storage) and isinstance(storage, (str, os.PathLike)):
+            storage = DirectoryStorage(os.fspath(storage))
+        self._storage = storage
 
+    def __mimejson_encode_item(self, obj, path, bundle=None, parts=None):
+        if type(obj) is LazyBlob:
+            ret = self._lazy_envelope(obj, bundle)
+            if ret is None:
+                return self.__mimejson_encode_item(obj.materialize(), path, bundle, parts)
+        else:
+            codec = self.codecs.lookup(obj, self.prefer)
+            if codec is None:
+                return obj
+            ret = self._encode_blob(codec, obj, bundle)
+        if parts is not None:
+            self._register_part(ret, path, parts)
         return ret
 
-    def __mimejson_decode_item(self, obj, key):
+    def __mimejson_submit_encode_item(self, obj, path):
+        if type(obj) is LazyBlob:
+            ret = self._lazy_envelope(obj)
+            if ret is not None:
+                future = concurrent.futures.Future()
+                future.set_result(ret)
+                return _Pending(future)
+            obj = obj.materialize()
+        codec = self.codecs.lookup(obj, self.prefer)
+        if codec is None:
+            return obj
+        return _Pending(self.executor.submit(self._encode_blob, codec, obj))
+
+    def _lazy_envelope(self, obj, bundle=None):
+        """
+        Return the envelope to be written for a `LazyBlob`, without decoding it.
+
+        The envelope is copied if the proxy was not decoded and the envelope stands on its own: objects
+        stored in a bundle, or at a relative path, are encoded again.
+
+        :param obj: the proxy
+        :param bundle: the bundle being written, if any
+        :return: a copy of the envelope, or None if the object has to be encoded again
+        """
+        envelope = obj.envelope
+        if obj.materialized or bundle is not None or '$offset$' in envelope:
+            return None
+        location = envelope.get('$path$')
+        if location is not None and not location.startswith("http") and not os.path.isabs(location):
+            return None
+        return dict(envelope)
+
+    def __mimejson_submit_decode_item(self, obj, path):
         if isinstance(obj, dict) and "$mimetype$" in obj:
             if obj["$mimetype$"] in self.codecs.all_codecs:
-                path = obj['$path$']
-                f = None
-                if path.startswith("http"):
-                    f = self.transport.get(obj['$path$'])
-                    path = f[0]
+                obj = _Pending(self.executor.submit(self._decode_envelope, obj))
+            else:
+                logging.warning("mimejson: unsupported mimetype: %s\n" % (obj['$mimetype$'],))
+        return obj
 
-                obj = self.codecs.all_codecs[obj["$mimetype$"]].decode(obj, path)
+    def __mimejson_collect_item(self, obj, path, parts=None):
+        if type(obj) is _Pending:
+            obj = obj.future.result()
+            if parts is not None:
+                self._register_part(obj, path, parts)
+        return obj
+
+    def _register_part(self, ret, path, parts):
+        """
+        Store encoded file for future transmission.
+
+        Parts are named after the key or the path of the object (see `_part_name`), which must be unique: keys
+        containing dots can make the names of different paths collide.
+
+        :param parts: dict of the files to be transmitted, indexed by part name
+        """
+        if path and '$path$' in ret:
+            name = _part_name(path, parts)
+            if name in parts:
+                raise ValueError("mimejson: several objects would be sent as part %r" % (name,))
+            parts[name] = (self._open_blob(ret['$path$']), ret['$length$'])
 
-                if f is not None:
-                    os.unlink(f[0])
+    def _open_blob(self, location):
+        """
+        Open a stored object for reading, from the storage or from the filesystem.
+        """
+        name = self.storage.lookup(location)
+        if name is not None:
+            return self.storage.open(name)
+        return open(location, 'rb')
+
+    def __mimejson_decode_item(self, obj, path, segments=None, stacks=None):
+        if isinstance(obj, dict) and "$mimetype$" in obj:
+            if obj["$mimetype$"] in self.codecs.all_codecs:
+                obj = self._decode_envelope(obj, segments, stacks)
             else:
                 logging.warning("mimejson: unsupported mimetype: %s\n" % (obj['$mimetype$'],))
         return obj
 
-    def _mimejson_encode_object(self, obj):
+    def __mimejson_lazy_decode_item(self, obj, path, segments=None, stacks=None):
+        if isinstance(obj, dict) and "$mimetype$" in obj:
+            if obj["$mimetype$"] in self.codecs.all_codecs:
+                obj = LazyBlob(obj, functools.partial(self._decode_envelope, segments=segments, stacks=stacks))
+            else:
+                logging.warning("mimejson: unsupported mimetype: %s\n" % (obj['$mimetype$'],))
+        return obj
+
+    def _encode_blob(self, codec, obj, bundle=None):
+        """
+        Encode an object with its codec, and return its envelope.
+
+        In content addressed mode, objects already stored are recognised by the `digest` of their raw
+        content when their codec provides one, and by identity otherwise: objects must then not be
+        modified once stored.
+        """
+        if not self.content_addressed or not hasattr(codec, 'write'):
+            return self._write_blob(codec, obj, bundle)
+
+        cache = bundle.cache if bundle is not None else self._blob_cache
+        if hasattr(codec, 'digest'):
+            digest = codec.digest(obj)
+            key = (codec.mimetype, digest) if digest is not None else None
+        else:
+            key = id(obj)
+
+        entry = cache.get(key) if key is not None else None
+        if entry is not None and (entry[0] is None or entry[0]() is obj):
+            return dict(entry[1])
+
+        ret = self._write_blob(codec, obj, bundle)
+        if key is not None:
+            ref = None
+            if not isinstance(key, tuple):
+                try:
+                    ref = weakref.ref(obj)
+                except TypeError:
+                    return ret
+            cache[key] = (ref, dict(ret))
+        return ret
+
+    def _write_blob(self, codec, obj, bundle=None):
+        """
+        Encode an object with its codec and store it, and return its envelope, measured by the instrumentation.
+        """
+        if self.instrumentation is None:
+            return self._codec_write(codec, obj, bundle)
+        start = time.perf_counter()
+        ret = self._codec_write(codec, obj, bundle)
+        self.instrumentation.record('codec.encode', ret['$mimetype$'], time.perf_counter() - start, nbytes(obj),
+                                    ret.get('$length$', 0))
+        return ret
+
+    def _codec_write(self, codec, obj, bundle=None):
+        """
+        Encode an object with its codec and store it, and return its envelope.
+
+        Codecs providing `write` have their output embedded in the envelope when it is smaller
+        than the inline threshold, and written to storage (or to a segment of the bundle) otherwise.
+        Nothing is stored when the codec fails.
+        """
+        options = self._codec_options(codec)
+        if not hasattr(codec, 'write'):
+            ret = codec.encode(obj, self.storage, **options)
+            if bundle is not None:
+                location = ret.pop('$path$')
+                with self._open_blob(location) as fp:
+                    ret['$offset$'], ret['$length$'] = bundle.add_file(fp)
+                # the encoded form was stored by the codec only to be copied to the bundle, external files
+                # referred to by the codec are left alone
+                name = self.storage.lookup(location)
+                if name is not None and location != getattr(obj, 'name', None):
+                    self.storage.delete(name)
+            return ret
+
+        extension = getattr(codec, 'extension', '')
+        if bundle is not None:
+            opener = bundle.open_segment
+        elif self.content_addressed:
+            opener = functools.partial(_ContentAddressedFile, self.storage, extension)
+        else:
+            name = self.storage.new_name(extension)
+            opener = functools.partial(self.storage.open, name, 'wb')
+        out = _SpillFile(self._inline_threshold(codec), opener)
+        try:
+            ret = codec.write(obj, out, **options)
+            ret['$length$'] = out.tell()
+        except BaseException:
+            out.discard()
+            if out.file is not None and bundle is None and not self.content_addressed:
+                self.storage.delete(name)
+            raise
+        out.close()
+        if out.inline:
+            ret['$encoding$'] = self.inline_encoding
+            ret['$data$'] = _INLINE_ENCODINGS[self.inline_encoding][0](out.getvalue()).decode('ascii')
+        elif bundle is not None:
+            ret['$offset$'] = out.file.offset
+        else:
+            ret['$path$'] = out.file.name
+        return ret
+
+    def _decode_envelope(self, obj, segments=None, stacks=None):
+        """
+        Decode an attached object from its envelope.
+
+        Envelopes with an `$index$` refer to an item of a stacked array (see `dumps_many`).
+
+        :param segments: the segments of the bundle the envelope was read from
+        :param stacks: dict of the stacked arrays already decoded, shared by the documents of a batch
+        """
+        if '$index$' in obj:
+            key = (obj['$mimetype$'], obj.get('$path$'), obj.get('$offset$'), obj.get('$data$'))
+            stack = stacks.get(key) if stacks is not None else None
+            if stack is None:
+                stack = self._decode_envelope(dict((k, v) for k, v in obj.items() if k != '$index$'), segments)
+                if stacks is not None:
+                    stacks[key] = stack
+            return stack[obj['$index$']]
+
+        codec = self.codecs.all_codecs[obj["$mimetype$"]]
+        if self.instrumentation is None:
+            return self._codec_decode(codec, obj, segments)
+        with self.instrumentation.span('codec.decode', obj["$mimetype$"]) as s:
+            ret = self._codec_decode(codec, obj, segments)
+            s.bytes_in = obj.get('$length$', 0)
+            s.bytes_out = nbytes(ret)
+        return ret
+
+    def _codec_decode(self, codec, obj, segments=None):
+        """
+        Decode an attached object with its codec, from wherever it is stored.
+        """
+        options = self._codec_options(codec)
+        if '$data$' in obj:
+            data = _INLINE_ENCODINGS[obj.get('$encoding$', 'base64')][1](obj['$data$'])
+            return self._decode_buffer(codec, obj, data, options)
+        if '$offset$' in obj:
+            if segments is None:
+                raise ValueError("mimejson: object stored in a bundle, use load_bundle")
+            offset = obj['$offset$']
+            return self._decode_buffer(codec, obj, segments[offset:offset + obj['$length$']], options)
+
+        filepath = obj['$path$']
+        if filepath.startswith("http"):
+            return self._decode_remote(codec, obj, options)
+        name = self.storage.lookup(filepath)
+        if name is not None and self.storage.local_path(name) is None:
+            return self._decode_buffer(codec, obj, self.storage.get(name), options)
+        return codec.decode(obj, filepath, **options)
+
+    def _decode_remote(self, codec, obj, options):
+        """
+        Download and decode a remote object.
+
+        Codecs providing `decode_range` read the parts of the object they need with range requests.
+        Other objects are decoded from the cache when there is one. Otherwise, they are downloaded in memory and
+        decoded from there when their codec supports it and they are smaller than `memory_download_limit`,
+        or they are downloaded to a temporary file.
+        """
+        length = obj.get('$length$')
+        if hasattr(codec, 'decode_range'):
+            return codec.decode_range(obj, functools.partial(self.transport.get_range, obj['$path$']), **options)
+
+        if self.cache is not None:
+            with self.cache.open(self.transport, obj['$path$'], length) as fn:
+                return codec.decode(obj, fn, **options)
+
+        if hasattr(codec, 'read') and length is not None and length <= self.memory_download_limit:
+            return self._decode_buffer(codec, obj, self.transport.fetch(obj['$path$'], length), options)
+
+        fd, fn = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'w+b') as fp:
+                self.transport.download(obj['$path$'], fp, length)
+            return codec.decode(obj, fn, **options)
+        finally:
+            os.unlink(fn)
+
+    def _decode_buffer(self, codec, obj, data, options):
+        """
+        Decode an object from a buffer holding its encoded form.
+        """
+        if hasattr(codec, 'read'):
+            return codec.read(obj, data, **options)
+
+        # codecs without `read` can only decode from files
+        fd, fn = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(data)
+            return codec.decode(obj, fn, **options)
+        finally:
+            os.unlink(fn)
+
+    def _for_codec(self, values, codec, default):
+        """
+        Return the value configured for a codec in a dict indexed by mimetype.
+        """
+        if values:
+            mimetypes = codec.mimetype if isinstance(codec.mimetype, tuple) else (codec.mimetype,)
+            for m in mimetypes:
+                if m in values:
+                    return values[m]
+        return default
+
+    def _codec_options(self, codec):
+        """
+        Return the options configured for a codec.
+        """
+        return self._for_codec(self.codec_options, codec, {})
+
+    def _inline_threshold(self, codec):
+        """
+        Return the inline threshold configured for a codec.
+        """
+        if isinstance(self.inline_threshold, dict):
+            return self._for_codec(self.inline_threshold, codec, 0)
+        return self.inline_threshold
+
+    def _mimejson_encode_object(self, obj, parts=None):
+        with span(self.instrumentation, 'walk', 'encode'):
+            return self._mimejson_encode_walk(obj, parts)
+
+    def _mimejson_encode_walk(self, obj, parts=None):
+        if self.executor is not None:
+            return self._mimejson_run_concurrently(obj, self.__mimejson_submit_encode_item, parts)
+        if parts is not None:
+            return _xmap(obj, functools.partial(self.__mimejson_encode_item, parts=parts))
         return _xmap(obj, self.__mimejson_encode_item)
 
-    def _mimejson_decode_object(self, obj):
-        return _xmap(obj, self.__mimejson_decode_item)
+    def _mimejson_decode_object(self, obj, lazy=False, segments=None, stacks=None):
+        with span(self.instrumentation, 'walk', 'decode'):
+            return self._mimejson_decode_walk(obj, lazy, segments, stacks)
+
+    def _mimejson_decode_walk(self, obj, lazy=False, segments=None, stacks=None):
+        if self.executor is not None and not lazy and segments is None and stacks is None:
+            return self._mimejson_run_concurrently(obj, self.__mimejson_submit_decode_item)
+        fct = self.__mimejson_lazy_decode_item if lazy else self.__mimejson_decode_item
+        if segments is not None or stacks is not None:
+            fct = functools.partial(fct, segments=segments, stacks=stacks)
+        return _xmap(obj, fct)
+
+    def __mimejson_encode_stacked_item(self, obj, path, envelopes=None):
+        envelope = envelopes.get(id(obj))
+        if envelope is not None:
+            return envelope
+        return self.__mimejson_encode_item(obj, path)
+
+    def _stack_arrays(self, docs):
+        """
+        Store the arrays of a batch of objects that can be stacked.
+
+        Arrays found in several objects at the same path, with the same shape and dtype, are stacked
+        and stored as one array.
+
+        :return: dict of the envelopes of the stacked arrays, indexed by object and by id of the array
+        """
+        numpy = sys.modules.get('numpy')
+        if numpy is None:
+            return {}
+
+        groups = {}
+        for i, doc in enumerate(docs):
+            def _collect(obj, path, i=i):
+                if type(obj) is numpy.ndarray:
+                    groups.setdefault((tuple(path), obj.shape, obj.dtype), []).append((i, obj))
+                return obj
+            _xmap(doc, _collect)
+
+        envelopes = {}
+        for (path, _shape, _dtype), items in groups.items():
+            if len(items) < 2:
+                continue
+            stack = numpy.stack([a for _i, a in items])
+            envelope = self._encode_blob(self.codecs.lookup(stack, self.prefer), stack)
+            for k, (i, a) in enumerate(items):
+                envelopes.setdefault(i, {})[id(a)] = dict(envelope, **{'$index$': k})
+        return envelopes
+
+    def _mimejson_run_concurrently(self, obj, submit, parts=None):
+        """
+        Transform an object with codecs running in the executor.
+
+        The object is walked once to submit the codec calls, and a second time to collect their results.
+        """
+        submitted = []
+
+        def _submit(item, path):
+            ret = submit(item, path)
+            if type(ret) is _Pending:
+                submitted.append(ret)
+            return ret
+
+        obj = _xmap(obj, _submit)
+        if not submitted:
+            return obj
+        try:
+            return _xmap(obj, functools.partial(self.__mimejson_collect_item, parts=parts))
+        except BaseException:
+            for p in submitted:
+                p.future.cancel()
+            raise
+
+    def _json_dumps(self, data, binary=False):
+        """
+        Encode a mimejson encoded object as a JSON string, or as UTF-8 bytes if binary is True.
+        """
+        with span(self.instrumentation, 'json', 'dumps') as s:
+            ret = self.json.dumpb(data) if binary else self.json.dumps(data)
+            s.bytes_out = len(ret)
+        return ret
+
+    def _json_loads(self, data):
+        """
+        Parse a JSON string or bytes.
+        """
+        with span(self.instrumentation, 'json', 'loads') as s:
+            s.bytes_in = len(data)
+            return self.json.loads(data)
 
     def dumps(self, data):
         """
@@ -223,7 +1158,133 @@ class MIMEJSON(object):
         :return: a mimejson encoded object with reference to stored elements
         """
         data = self._mimejson_encode_object(data)
-        return json.dumps(data)
+        return self._json_dumps(data)
+
+    def dumpb(self, data):
+        """
+        Encode an object and store associated objects in storage, as `dumps` does.
+
+        :return: a mimejson encoded object with reference to stored elements, as UTF-8 bytes
+        """
+        data = self._mimejson_encode_object(data)
+        return self._json_dumps(data, binary=True)
+
+    def dumps_many(self, docs):
+        """
+        Encode a batch of objects.
+
+        Arrays found in several objects at the same path, with the same shape and dtype, are stacked
+        and stored once, as one contiguous array. Their envelopes refer to the stacked array with the
+        `$index$` of the array in the stack.
+
+        :param docs: list of objects
+        :return: list of mimejson encoded objects
+        """
+        envelopes = self._stack_arrays(docs)
+        ret = []
+        for i, doc in enumerate(docs):
+            if i in envelopes:
+                fct = functools.partial(self.__mimejson_encode_stacked_item, envelopes=envelopes[i])
+                ret.append(self._json_dumps(_xmap(doc, fct)))
+            else:
+                ret.append(self.dumps(doc))
+        return ret
+
+    def iterdumps_many(self, docs, batch_size=256):
+        """
+        Encode an iterable of objects, in batches (see `dumps_many`).
+
+        :return: an iterator over the mimejson encoded objects
+        """
+        for batch in _batches(docs, batch_size):
+            for data in self.dumps_many(batch):
+                yield data
+
+    def iterencode(self, data):
+        """
+        Encode an object as an iterator of JSON chunks.
+
+        Associated objects are encoded and stored as they are reached by the walk, no encoded
+        copy of the object is built. Joining the chunks gives the same document as `dumps`, with
+        the same JSON backend.
+        Codecs are applied to containers before their content is walked.
+
+        :return: an iterator over the chunks of the mimejson encoded object
+        """
+        encode_json = self.json.dumps
+        item_separator, key_separator = self.json.separators
+        first_key, next_key = '{0}' + key_separator, item_separator + '{0}' + key_separator
+        encode_item = self.__mimejson_encode_item
+        stack = []
+        walked = set()  # < ids of the containers on the stack
+        node, path = data, _ROOT
+        while True:
+            encoded = encode_item(node, path)
+            if encoded is node and type(node) in _CONTAINERS:
+                if id(node) in walked:
+                    raise ValueError("Circular reference detected")
+                walked.add(id(node))
+                if type(node) is dict:
+                    yield '{'
+                    stack.append([iter(node.items()), True, path, True, node])
+                else:
+                    yield '['
+                    stack.append([enumerate(node), False, path, True, node])
+            else:
+                yield encode_json(encoded)
+
+            while stack:
+                frame = stack[-1]
+                try:
+                    k, node = next(frame[0])
+                except StopIteration:
+                    stack.pop()
+                    walked.discard(id(frame[4]))
+                    yield '}' if frame[1] else ']'
+                    continue
+                if frame[1]:
+                    yield (first_key if frame[3] else next_key).format(_json_key(k, encode_json))
+                elif not frame[3]:
+                    yield item_separator
+                frame[3] = False
+                path = _Path(frame[2], k)
+                break
+            else:
+                return
+
+    def dump(self, data, fp):
+        """
+        Encode an object to a file-like object and store associated objects in storage.
+
+        The JSON document is written chunk by chunk, see `iterencode`.
+
+        :param data: The object to be encoded
+        :param fp: a file-like object opened for writing text
+        """
+        with span(self.instrumentation, 'walk', 'encode'):
+            for chunk in self.iterencode(data):
+                fp.write(chunk)
+
+    def dump_bundle(self, data, fp):
+        """
+        Encode an object and its associated objects in a single bundle file.
+
+        Associated objects are stored in page-aligned segments of the bundle (see `mimejson.bundle`),
+        unless they are embedded in the document.
+
+        :param data: The object to be encoded
+        :param fp: path of the bundle, or binary file-like object
+        """
+        if isinstance(fp, STRING_TYPES):
+            with open(fp, 'wb') as out:
+                return self.dump_bundle(data, out)
+
+        bundle = BundleWriter()
+        try:
+            data = _xmap(data, functools.partial(self.__mimejson_encode_item, bundle=bundle))
+            bundle.write(fp, self._json_dumps(data, binary=True))
+        finally:
+            bundle.close()
 
     def push(self, data, url):
         """
@@ -233,62 +1294,189 @@ class MIMEJSON(object):
         :param url: the endpoint to be queried
         :return: response from the API endpoint (assumed to be MIMEJSON)
         """
-        data = self._mimejson_encode_object(data)
         if not self.transport:
             raise ValueError("Not connected")
 
-        result = self.transport.send(data=data, files=self._objects, url=url)
+        parts = {}
+        try:
+            data = self._mimejson_encode_object(data, parts)
+            return self.transport.send(data=data, files=parts, url=url)
+        finally:
+            for k in parts:
+                parts[k][0].close()
 
-        for k in self._objects:
-            self._objects[k].close()
-        self._objects = {}
+    async def push_async(self, data, url):
+        """
+        Asynchronous version of `push`, using the asyncio transport.
 
-        return result
+        Objects are encoded outside of the event loop, in its default executor.
 
-    def load(self, uri):
+        :param data: The object to be sent
+        :param url: the endpoint to be queried
+        :return: response from the API endpoint (assumed to be MIMEJSON)
+        """
+        if not self.async_transport:
+            raise ValueError("Not connected")
+
+        loop = asyncio.get_running_loop()
+        parts = {}
+        try:
+            data = await loop.run_in_executor(None, self._mimejson_encode_object, data, parts)
+            return await self.async_transport.send(data=data, files=parts, url=url)
+        finally:
+            for k in parts:
+                parts[k][0].close()
+
+    async def load_async(self, uri, lazy=False):
+        """
+        Asynchronous version of `load`, using the asyncio transport.
+
+        Remote objects are downloaded concurrently.
+        """
+        if os.path.isfile(uri):
+            with open(uri, 'rb') as json_file:
+                data = self._json_loads(json_file.read())
+        else:
+            data = self._json_loads(await self.async_transport.get(uri))
+        return await self._mimejson_decode_object_async(data, lazy)
+
+    async def loads_async(self, data, lazy=False):
+        """
+        Asynchronous version of `loads`, using the asyncio transport.
+
+        Remote objects are downloaded concurrently.
+        """
+        return await self._mimejson_decode_object_async(self._json_loads(data), lazy)
+
+    async def _mimejson_decode_object_async(self, obj, lazy=False):
+        if lazy:
+            return self._mimejson_decode_object(obj, lazy=True)
+
+        tasks = []
+
+        def _submit(item, path):
+            if isinstance(item, dict) and "$mimetype$" in item:
+                if item["$mimetype$"] in self.codecs.all_codecs:
+                    tasks.append(asyncio.ensure_future(self._decode_envelope_async(item)))
+                    return _Pending(tasks[-1])
+                logging.warning("mimejson: unsupported mimetype: %s\n" % (item['$mimetype$'],))
+            return item
+
+        obj = _xmap(obj, _submit)
+        if not tasks:
+            return obj
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            raise
+        return _xmap(obj, self.__mimejson_collect_item)
+
+    async def _decode_envelope_async(self, obj):
+        """
+        Decode an attached object from its envelope, downloading it with the asyncio transport.
+        """
+        loop = asyncio.get_running_loop()
+        path = obj.get('$path$')
+        if path is None or not path.startswith("http"):
+            return await loop.run_in_executor(self.executor, self._decode_envelope, obj)
+
+        content = await self.async_transport.get(path)
+        codec = self.codecs.all_codecs[obj["$mimetype$"]]
+        ret = await loop.run_in_executor(self.executor, self._decode_buffer, codec, obj, content,
+                                         self._codec_options(codec))
+        if '$index$' in obj:
+            ret = ret[obj['$index$']]
+        return ret
+
+    def load(self, uri, lazy=False):
         """
         Load object from url/path/file.
+
+        :param lazy: if True, attached objects are returned as `LazyBlob` proxies decoded on first access
         """
         if os.path.isfile(uri):
-            json_file = open(uri, 'r+')
-            data = json.load(json_file)
-            json_file.close()
+            with open(uri, 'rb') as json_file:
+                data = self._json_loads(json_file.read())
         else:
-            data = json.loads(self.transport.get(uri))
+            data = self._json_loads(self.transport.get(uri))
 
-        data = self._mimejson_decode_object(data)
+        data = self._mimejson_decode_object(data, lazy)
         return data
 
-    def loads(self, data):
+    def load_bundle(self, fp, lazy=False):
+        """
+        Load object from a bundle file.
+
+        The bundle is memory mapped, objects are decoded straight from their segment.
+
+        :param fp: path of the bundle, or binary file object
+        :param lazy: if True, attached objects are returned as `LazyBlob` proxies decoded on first access
+        """
+        if isinstance(fp, STRING_TYPES):
+            with open(fp, 'rb') as f:
+                return self.load_bundle(f, lazy)
+
+        buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        header, start = read_header(buf)
+        return self._mimejson_decode_object(self._json_loads(header), lazy, memoryview(buf)[start:])
+
+    def loads(self, data, lazy=False):
         """
         Load object from string json.
+
+        :param lazy: if True, attached objects are returned as `LazyBlob` proxies decoded on first access
         """
-        data = self._mimejson_decode_object(json.loads(data))
+        data = self._mimejson_decode_object(self._json_loads(data), lazy)
         return data
 
-    def loadd(self, object_instance):
+    def loads_many(self, data, lazy=False):
+        """
+        Load a batch of objects from json strings.
+
+        Stacked arrays are decoded once for the batch, the arrays of the objects are views of them.
+
+        :param data: list of json strings
+        :param lazy: if True, attached objects are returned as `LazyBlob` proxies decoded on first access
+        """
+        stacks = {}
+        return [self._mimejson_decode_object(self._json_loads(d), lazy, stacks=stacks) for d in data]
+
+    def iterloads_many(self, data, lazy=False, batch_size=256):
+        """
+        Load an iterable of json strings, in batches (see `loads_many`).
+
+        :return: an iterator over the decoded objects
+        """
+        for batch in _batches(data, batch_size):
+            for obj in self.loads_many(batch, lazy):
+                yield obj
+
+    def loadd(self, object_instance, lazy=False):
         """
         Load object from dict.
+
+        :param lazy: if True, attached objects are returned as `LazyBlob` proxies decoded on first access
         """
-        data = self._mimejson_decode_object(object_instance)
+        data = self._mimejson_decode_object(object_instance, lazy)
         return data
 
-    # current implementation requires a temporary folder
-    # with pattern ensures this folder is created and deleted as necessary
+    # with pattern ensures the storage is set up and cleaned as necessary
     def __enter__(self):
-        if os.path.exists(self.storage) and self.using_tmp_storage:
-            errmsg = """
-            Temporary folder %s must be a non-existent as it will be deleted on exit
-            """ % (self.storage,)
-            raise Exception(errmsg)
-
-        if not os.path.exists(self.storage):
-            _mkdir_p(self.storage)
-            os.chmod(self.storage, 0o700)
+        self.storage.setup()
+        if self._own_executor and self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(self.workers)
         return self
 
     def __exit__(self, *_args):
-        if self.using_tmp_storage:
-            for f in os.listdir(self.storage):
-                os.unlink(os.path.join(self.storage, f))
-            os.rmdir(self.storage)
+        self._blob_cache = {}
+        if self._own_executor:
+            self.executor.shutdown()
+            self.executor = None
+        if self._own_transport:
+            self.transport.close()
+        if self._own_codec_instrumentation and self.codecs.instrumentation is self.instrumentation:
+            del self.codecs.instrumentation
+            self._own_codec_instrumentation = False
+        self.storage.teardown()
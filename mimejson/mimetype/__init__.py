@@ -0,0 +1,61 @@
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+"""
+Codecs distributed with MIMEJSON.
+
+The manifest declares each codec without importing it:
+
+    module      the module defining the codec class
+    codec       the name of the codec class, 'Serializer' by default
+    mimetypes   the mimetypes the codec decodes
+    types       qualified names (module.class) of the types the codec encodes
+    predicate   if True, the codec is consulted with `can_apply` for objects of other types
+
+A codec module, and the libraries it depends on, are only imported when an object of one of its
+types or an envelope of one of its mimetypes is met. Other packages declare codecs in the same
+way with a `mimejson.codecs` entry point naming a manifest entry, or a list of entries.
+"""
+
+MANIFEST = (
+    {'module': 'mimejson.mimetype.file', 'mimetypes': ('file', 'application/bytes'), 'predicate': True},
+    {'module': 'mimejson.mimetype.jpg', 'mimetypes': ('image/jpg',),
+     'types': ('PIL.JpegImagePlugin.JpegImageFile',)},
+    {'module': 'mimejson.mimetype.numpy', 'mimetypes': ('application/npz', 'application/npy'),
+     'types': ('numpy.ndarray',)},
+    {'module': 'mimejson.mimetype.numpy_chunked', 'mimetypes': ('application/x-npy-chunked',),
+     'types': ('numpy.ndarray',)},
+    {'module': 'mimejson.mimetype.numpy_compressed', 'mimetypes': ('application/x-npy-compressed',),
+     'types': ('numpy.ndarray',)},
+    {'module': 'mimejson.mimetype.png', 'mimetypes': ('image/png',),
+     'types': ('PIL.PngImagePlugin.PngImageFile', 'PIL.Image.Image')},
+    {'module': 'mimejson.mimetype.video_opencv', 'mimetypes': ('video/FMP4', 'video/DIVX', 'video/x-msvideo'),
+     'types': ('mimejson.video.Video',)},
+)
@@ -29,7 +29,6 @@
 # |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
 # ############################################################################
 import os
-import uuid
 
 
 class Serializer:
@@ -46,18 +45,19 @@ class Serializer:
         return hasattr(obj, 'read')
 
     @classmethod
-    def encode(cls, obj, pathdir):
+    def encode(cls, obj, storage, **_options):
         if (hasattr(obj, "name")) and (os.path.exists(obj.name)):
             return {'$path$': obj.name, '$length$': os.stat(obj.name).st_size,
                     '$mimetype$': cls.mimetype[-1]}
-        fn = os.path.join(pathdir, "%s_package" % (uuid.uuid1(),))
-        with open(fn, 'w') as out:
-            out.write(obj.read())
-            out.close()
+        name = storage.new_name("_package")
+        data = obj.read()
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        storage.put(name, data)
         obj.close()
-        return {'$path$': fn, '$length$': os.stat(fn).st_size,
+        return {'$path$': storage.location(name), '$length$': len(data),
                 '$mimetype$': cls.mimetype[-1]}
 
     @staticmethod
-    def decode(obj, pathdir):
+    def decode(obj, pathdir, **_options):
         return open(pathdir, 'r')
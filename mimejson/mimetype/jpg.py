@@ -28,32 +28,59 @@
 # SUCH DAMAGE.
 # |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
 # ############################################################################
-import os
-import uuid
+import io
 
-import PIL.PngImagePlugin
+import PIL.Image
+import PIL.JpegImagePlugin
+
+
+def _open(fp, draft_size=None):
+    """
+    Open a JPEG image, decoded at a reduced resolution of at least draft_size when given.
+    """
+    image = PIL.Image.open(fp)
+    if draft_size is not None:
+        image.draft(image.mode, tuple(draft_size))
+    return image
 
 
 class Serializer:
     """
     MIMEJSON serializer that allows to dump and load JPG images attached to objects.
+
+    JPEG images are stored as JPEG, other PIL images are stored by the PNG codec. Options:
+      quality: from 1 to 95, or 'keep' to reuse the quantization of the image, 75 by default
+      optimize: if True, compute optimal Huffman tables, at the cost of speed
+      progressive: if True, store a progressive JPEG
+      draft_size: (width, height) on decoding, images are decoded at the smallest scale (1/2, 1/4 or 1/8)
+        at least as large, which is much faster than decoding them at full resolution
     """
     mimetype = "image/jpg"
+    types = (PIL.JpegImagePlugin.JpegImageFile,)
+    extension = ".jpg"
 
     @staticmethod
     def can_apply(obj):
-        cl = [PIL.JpegImagePlugin.JpegImageFile, PIL.Image.Image]
-        return hasattr(obj, "__class__") and obj.__class__ in cl
+        return isinstance(obj, PIL.JpegImagePlugin.JpegImageFile)
 
     @classmethod
-    def encode(cls, obj, pathdir):
-        if not os.path.exists(pathdir):
-            os.mkdir(pathdir)
-        fn = os.path.join(pathdir, "%s.jpg" % (uuid.uuid1(),))
-        obj.save(fn)
-        return {'$path$': fn, '$length$': os.stat(fn).st_size,
-                '$mimetype$': cls.mimetype}
+    def encode(cls, obj, storage, **options):
+        name = storage.new_name(cls.extension)
+        with storage.open(name, "wb") as fp:
+            ret = cls.write(obj, fp, **options)
+            ret['$length$'] = fp.tell()
+        ret['$path$'] = storage.location(name)
+        return ret
+
+    @classmethod
+    def write(cls, obj, fp, quality=75, optimize=False, progressive=False, **_options):
+        obj.save(fp, format="JPEG", quality=quality, optimize=optimize, progressive=progressive)
+        return {'$mimetype$': cls.mimetype}
+
+    @staticmethod
+    def decode(obj, filepath, draft_size=None, **_options):
+        return _open(filepath, draft_size)
 
     @staticmethod
-    def decode(obj, filepath):
-        return PIL.Image.open(filepath)
+    def read(obj, buf, draft_size=None, **_options):
+        return _open(io.BytesIO(buf), draft_size)
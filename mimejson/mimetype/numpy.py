@@ -28,30 +28,105 @@
 # SUCH DAMAGE.
 # |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
 # ############################################################################
-import os
-import uuid
+import hashlib
+import io
+import struct
 
 import numpy
+import numpy.lib.format
+
+
+def _write_array(fp, array):
+    """
+    Write an array to fp in the .npy format.
+
+    Contiguous arrays of plain dtypes are written straight from the memory of the array.
+    """
+    if array.dtype.hasobject or array.dtype.fields is not None or \
+            not (array.flags.c_contiguous or array.flags.f_contiguous):
+        numpy.lib.format.write_array(fp, array)
+        return
+    header = numpy.lib.format.header_data_from_array_1_0(array)
+    numpy.lib.format.write_array_header_1_0(fp, header)
+    data = array.T if header['fortran_order'] else array
+    fp.write(memoryview(data.reshape(-1).view(numpy.uint8)))
+
+
+def _read_array(buf, mmap_mode=None):
+    """
+    Read an array stored in the .npy format from a buffer.
+
+    With mmap_mode 'r', the array is a read-only view of the buffer.
+    """
+    view = memoryview(buf)
+    if view[6:7].tobytes() == b"\x01":
+        start, = struct.unpack("<H", view[8:10].tobytes())
+        start += 10
+    else:
+        start, = struct.unpack("<I", view[8:12].tobytes())
+        start += 12
+    fp = io.BytesIO(view[:start].tobytes())
+    version = numpy.lib.format.read_magic(fp)
+    if version == (1, 0):
+        shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(fp)
+    else:
+        shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(fp)
+    if dtype.hasobject:
+        return numpy.load(io.BytesIO(view.tobytes()))
+
+    count = 1
+    for n in shape:
+        count *= n
+    array = numpy.frombuffer(view, dtype=dtype, count=count, offset=start)
+    array = array.reshape(shape, order='F' if fortran_order else 'C')
+    if mmap_mode != 'r':
+        array = array.copy(order='K')
+    return array
 
 
 class Serializer:
     """
     MIMEJSON serializer that transmits numerical data.
+
+    Arrays are stored as .npy files. Options:
+      mmap_mode: None (default) to load arrays in memory, 'r' to decode read-only memory maps of
+        the stored files, 'c' for copy-on-write memory maps.
     """
 
-    mimetype = "application/npz"
+    mimetype = ("application/npz", "application/npy")
+    types = (numpy.ndarray,)
+    extension = ".npy"
 
     @staticmethod
     def can_apply(obj):
         return hasattr(obj, "__class__") and isinstance(obj, numpy.ndarray)
 
     @classmethod
-    def encode(cls, obj, pathdir):
-        fn = os.path.join(pathdir, "%s.npz" % (uuid.uuid1(),))
-        numpy.save(open(fn,"wb"),obj)
-        return {'$path$': fn, '$length$': os.stat(fn).st_size,
-                '$mimetype$': cls.mimetype}
+    def encode(cls, obj, storage, **options):
+        name = storage.new_name(cls.extension)
+        with storage.open(name, "wb") as fp:
+            ret = cls.write(obj, fp, **options)
+            ret['$length$'] = fp.tell()
+        ret['$path$'] = storage.location(name)
+        return ret
+
+    @classmethod
+    def write(cls, obj, fp, **_options):
+        _write_array(fp, obj)
+        return {'$mimetype$': cls.mimetype[-1]}
+
+    @staticmethod
+    def digest(obj):
+        if obj.dtype.hasobject:
+            return None
+        h = hashlib.sha256(("%r%r" % (obj.dtype.descr, obj.shape)).encode("ascii"))
+        h.update(memoryview(numpy.ascontiguousarray(obj).reshape(-1).view(numpy.uint8)))
+        return h.hexdigest()
+
+    @staticmethod
+    def decode(obj, filepath, mmap_mode=None, **_options):
+        return numpy.load(filepath, mmap_mode=mmap_mode)
 
     @staticmethod
-    def decode(obj, pathdir):
-        return numpy.load(os.path.join(pathdir, obj['$path$']))
+    def read(obj, buf, mmap_mode=None, **_options):
+        return _read_array(buf, mmap_mode)
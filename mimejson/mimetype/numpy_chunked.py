@@ -0,0 +1,280 @@
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+import itertools
+import os
+
+import numpy
+import numpy.lib.format
+
+from .numpy import Serializer as _NpySerializer
+from .numpy_compressed import COMPRESSORS, compress_chunk, decompress_chunk, read_chunks, write_chunks
+
+
+def _default_chunk_shape(shape, itemsize, chunk_bytes):
+    """
+    Return a chunk shape of at most chunk_bytes, halving the largest dimension until it fits.
+    """
+    chunk = list(shape)
+    while chunk and int(numpy.prod(chunk)) * itemsize > chunk_bytes and max(chunk) > 1:
+        k = chunk.index(max(chunk))
+        chunk[k] = (chunk[k] + 1) // 2
+    return [max(n, 1) for n in chunk]
+
+
+class _FileReader(object):
+
+    """
+    Reads ranges of a local file.
+    """
+
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def __call__(self, offset, length):
+        return os.pread(self.fd, length, offset)
+
+    def __del__(self):
+        fd = getattr(self, 'fd', None)
+        if fd is not None:
+            os.close(fd)
+
+
+class _BufferReader(object):
+
+    """
+    Reads ranges of a buffer.
+    """
+
+    def __init__(self, buf):
+        self.view = memoryview(buf)
+
+    def __call__(self, offset, length):
+        return self.view[offset:offset + length]
+
+
+class ChunkedArray(object):
+
+    """
+    Array stored in chunks, whose slices only read the chunks they overlap.
+
+    Integers, slices and Ellipsis are supported as indices, `numpy.asarray` reads the whole array.
+    """
+
+    def __init__(self, envelope, reader, workers=4):
+        """
+        Create a chunked array.
+
+        :param envelope: the envelope of the array
+        :param reader: function returning `length` bytes of the stored array from `offset`
+        :param workers: number of threads reading chunks
+        """
+        self.envelope = envelope
+        self.reader = reader
+        self.workers = workers
+        self.dtype = numpy.lib.format.descr_to_dtype(envelope['$dtype$'])
+        self.shape = tuple(envelope['$shape$'])
+        self.chunk_shape = tuple(envelope['$chunk_shape$'])
+        self.grid = tuple(-(-n // c) for n, c in zip(self.shape, self.chunk_shape))
+        self.offsets = []
+        offset = 0
+        for length in envelope['$chunks$']:
+            self.offsets.append((offset, length))
+            offset += length
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(numpy.prod(self.shape))
+
+    def __len__(self):
+        if not self.shape:
+            raise TypeError("len() of unsized object")
+        return self.shape[0]
+
+    def __repr__(self):
+        return "ChunkedArray(shape=%r, dtype=%s, chunk_shape=%r)" % (self.shape, self.dtype, self.chunk_shape)
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[...]
+        return array if dtype is None else array.astype(dtype)
+
+    def read_chunk(self, position):
+        """
+        Read a chunk.
+
+        :param position: position of the chunk in the chunk grid
+        :return: the chunk, an array
+        """
+        index = int(numpy.ravel_multi_index(position, self.grid))
+        offset, length = self.offsets[index]
+        shape = tuple(min(c, n - p * c) for p, c, n in zip(position, self.chunk_shape, self.shape))
+        data = self.reader(offset, length)
+        compression = self.envelope.get('$compression$')
+        if compression is None:
+            return numpy.frombuffer(data, dtype=self.dtype).reshape(shape)
+        chunk = numpy.empty(shape, dtype=self.dtype)
+        decompress_chunk(data, chunk.reshape(-1).view(numpy.uint8), max(self.dtype.itemsize, 1), compression,
+                         self.envelope.get('$shuffle$', True))
+        return chunk
+
+    def _axis_groups(self, axis, indices):
+        """
+        Group the indices selected on an axis by chunk.
+
+        :return: list of (chunk position, slice of the output, indices in the chunk) tuples
+        """
+        c = self.chunk_shape[axis]
+        indices = numpy.asarray(indices)
+        positions = indices // c
+        bounds = [0] + list(numpy.flatnonzero(numpy.diff(positions)) + 1) + [len(indices)]
+        return [(int(positions[start]), slice(start, end), indices[start:end] - positions[start] * c)
+                for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        # as for arrays, indexing with an Ellipsis gives an array, even of 0 dimension
+        ellipsis = (Ellipsis,) if any(k is Ellipsis for k in key) else ()
+        if ellipsis:
+            e = key.index(Ellipsis)
+            key = key[:e] + (slice(None),) * (self.ndim - len(key) + 1) + key[e + 1:]
+        key = key + (slice(None),) * (self.ndim - len(key))
+        if len(key) > self.ndim:
+            raise IndexError("too many indices for array of dimension %d" % (self.ndim,))
+
+        selections, squeeze = [], []
+        for n, k in zip(self.shape, key):
+            if isinstance(k, slice):
+                selections.append(range(*k.indices(n)))
+                squeeze.append(slice(None))
+            elif isinstance(k, (int, numpy.integer)):
+                if not -n <= k < n:
+                    raise IndexError("index %d is out of bounds for axis with size %d" % (k, n))
+                selections.append(range(k % n, k % n + 1))
+                squeeze.append(0)
+            else:
+                raise IndexError("mimejson: chunked arrays only support integers, slices and Ellipsis as indices")
+
+        out = numpy.empty(tuple(len(s) for s in selections), dtype=self.dtype)
+        groups = [self._axis_groups(axis, s) for axis, s in enumerate(selections)]
+        blocks = list(itertools.product(*groups)) if out.size else []
+
+        def _copy(i):
+            block = blocks[i]
+            chunk = self.read_chunk(tuple(g[0] for g in block))
+            out[tuple(g[1] for g in block)] = chunk[numpy.ix_(*[g[2] for g in block])]
+
+        read_chunks(_copy, len(blocks), self.workers)
+        return out[tuple(squeeze) + ellipsis]
+
+
+class Serializer:
+    """
+    MIMEJSON serializer that stores arrays in N-dimensional chunks, for partial reads.
+
+    The chunks are stored one after the other, in C order of the chunk grid, optionally compressed. The
+    envelope records the dtype, the shape, the shape of the chunks and the length of each chunk. Arrays
+    are decoded as `ChunkedArray` objects, reading only the chunks their slices overlap, from the file
+    or buffer of the array, or with range requests for remote arrays.
+
+    Arrays are encoded with this codec when its mimetype is preferred (see `MIMEJSON.prefer`). Options:
+      chunk_shape: shape of the chunks, by default chunks of at most chunk_bytes
+      chunk_bytes: size of the default chunks, 1 MiB by default
+      compression: None (default) or a compression of `numpy_compressed.COMPRESSORS`
+      level, shuffle: compression parameters
+      workers: number of threads writing and reading chunks
+    """
+
+    mimetype = "application/x-npy-chunked"
+    types = (numpy.ndarray,)
+    extension = ".npk"
+
+    @staticmethod
+    def can_apply(obj):
+        return isinstance(obj, numpy.ndarray)
+
+    @classmethod
+    def encode(cls, obj, storage, **options):
+        name = storage.new_name(cls.extension)
+        with storage.open(name, "wb") as fp:
+            ret = cls.write(obj, fp, **options)
+            ret['$length$'] = fp.tell()
+        ret['$path$'] = storage.location(name)
+        return ret
+
+    @classmethod
+    def write(cls, obj, fp, chunk_shape=None, chunk_bytes=1 << 20, compression=None, level=None, shuffle=True,
+              workers=None, **_options):
+        if obj.dtype.hasobject:
+            raise ValueError("mimejson: arrays of python objects can not be chunked")
+        if compression is not None and compression not in COMPRESSORS:
+            raise ValueError("mimejson: unknown compression %r" % (compression,))
+        itemsize = max(obj.dtype.itemsize, 1)
+        if chunk_shape is None:
+            chunk_shape = _default_chunk_shape(obj.shape, itemsize, chunk_bytes)
+        chunk_shape = [max(int(c), 1) for c in chunk_shape]
+        if len(chunk_shape) != obj.ndim:
+            raise ValueError("mimejson: chunk shape %r does not match the %d dimensions of the array"
+                             % (tuple(chunk_shape), obj.ndim))
+        grid = [-(-n // c) for n, c in zip(obj.shape, chunk_shape)]
+        positions = list(itertools.product(*[range(g) for g in grid])) if obj.size else []
+
+        def _chunk(i):
+            chunk = numpy.ascontiguousarray(obj[tuple(slice(p * c, (p + 1) * c)
+                                                      for p, c in zip(positions[i], chunk_shape))])
+            data = chunk.reshape(-1).view(numpy.uint8)
+            if compression is None:
+                return data.tobytes()
+            return compress_chunk(data, itemsize, compression, level, shuffle)
+
+        chunks = write_chunks(fp, _chunk, len(positions), workers)
+        return {'$mimetype$': cls.mimetype, '$dtype$': numpy.lib.format.dtype_to_descr(obj.dtype),
+                '$shape$': list(obj.shape), '$chunk_shape$': chunk_shape, '$compression$': compression,
+                '$level$': level, '$shuffle$': bool(shuffle), '$chunks$': chunks}
+
+    @staticmethod
+    def digest(obj):
+        return _NpySerializer.digest(obj)
+
+    @staticmethod
+    def decode(obj, filepath, workers=4, **_options):
+        return ChunkedArray(obj, _FileReader(filepath), workers)
+
+    @staticmethod
+    def read(obj, buf, workers=4, **_options):
+        return ChunkedArray(obj, _BufferReader(buf), workers)
+
+    @staticmethod
+    def decode_range(obj, reader, workers=4, **_options):
+        return ChunkedArray(obj, reader, workers)
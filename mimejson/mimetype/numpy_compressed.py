@@ -0,0 +1,254 @@
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+import collections
+import concurrent.futures
+import lzma
+import mmap
+import os
+import zlib
+
+import numpy
+import numpy.lib.format
+
+from .numpy import Serializer as _NpySerializer
+
+COMPRESSORS = {
+    'zlib': (lambda data, level: zlib.compress(data, 6 if level is None else level), zlib.decompress),
+    'lzma': (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+
+try:
+    import zstandard
+    COMPRESSORS['zstd'] = (lambda data, level: zstandard.ZstdCompressor(level=3 if level is None else level)
+                           .compress(data),
+                           lambda data: zstandard.ZstdDecompressor().decompress(data))
+except ImportError:
+    pass
+
+try:
+    import lz4.frame
+    COMPRESSORS['lz4'] = (lambda data, level: lz4.frame.compress(data, compression_level=level or 0),
+                          lz4.frame.decompress)
+except ImportError:
+    pass
+
+
+def _flat_bytes(array):
+    """
+    Return the memory of an array as a flat uint8 array, and whether it is in Fortran order.
+    """
+    fortran_order = array.flags.f_contiguous and not array.flags.c_contiguous
+    order = 'F' if fortran_order else 'C'
+    data = numpy.asarray(array).reshape(-1, order=order)
+    if not data.flags.c_contiguous:
+        data = numpy.ascontiguousarray(data)
+    return data.view(numpy.uint8), fortran_order
+
+
+def _shuffle(data, itemsize):
+    """
+    Group the bytes of elements by rank: all first bytes, then all second bytes...
+    """
+    if itemsize == 1:
+        return data.tobytes()
+    return data.reshape(-1, itemsize).T.tobytes()
+
+
+def _unshuffle(data, out, itemsize):
+    if itemsize == 1:
+        out[:] = data
+    else:
+        out.reshape(-1, itemsize)[...] = data.reshape(itemsize, -1).T
+
+
+def compress_chunk(data, itemsize, compression, level=None, shuffle=True):
+    """
+    Compress a chunk of elements.
+
+    :param data: the bytes of the elements, a flat uint8 array
+    :return: the compressed chunk
+    """
+    return COMPRESSORS[compression][0](_shuffle(data, itemsize) if shuffle else data.tobytes(), level)
+
+
+def decompress_chunk(data, out, itemsize, compression, shuffle=True):
+    """
+    Decompress a chunk of elements.
+
+    :param data: the compressed chunk, a bytes-like object
+    :param out: flat uint8 array receiving the bytes of the elements
+    """
+    data = numpy.frombuffer(COMPRESSORS[compression][1](data), dtype=numpy.uint8)
+    if shuffle:
+        _unshuffle(data, out, itemsize)
+    else:
+        out[:] = data
+
+
+def write_chunks(fp, produce, count, workers=None):
+    """
+    Write chunks computed by threads to a file, in order.
+
+    At most two chunks per thread are held in memory.
+
+    :param produce: function returning the bytes of the i-th chunk
+    :param count: number of chunks
+    :param workers: number of threads, the number of CPUs by default
+    :return: the lengths of the chunks
+    """
+    lengths = []
+
+    def _write(data):
+        fp.write(data)
+        lengths.append(len(data))
+
+    if count <= 1:
+        for i in range(count):
+            _write(produce(i))
+        return lengths
+
+    workers = workers or os.cpu_count()
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        pending = collections.deque()
+        for i in range(count):
+            pending.append(pool.submit(produce, i))
+            if len(pending) >= 2 * workers:
+                _write(pending.popleft().result())
+        while pending:
+            _write(pending.popleft().result())
+    return lengths
+
+
+def read_chunks(consume, count, workers=None):
+    """
+    Call a function for each chunk, in threads.
+
+    :param consume: function called with the index of a chunk
+    """
+    if count <= 1:
+        for i in range(count):
+            consume(i)
+        return
+    with concurrent.futures.ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        for _ in pool.map(consume, range(count)):
+            pass
+
+
+class Serializer:
+    """
+    MIMEJSON serializer that transmits numerical data compressed.
+
+    Arrays are split in chunks of chunk_size bytes, shuffled so that the n-th bytes of the elements of
+    a chunk are contiguous, and compressed in parallel. The compressed chunks are concatenated, the
+    envelope records the dtype, the shape and the compression parameters, and the length of each chunk.
+
+    Arrays are encoded with this codec when its mimetype is preferred (see `MIMEJSON.prefer`). Options:
+      compression: 'zlib' (default), 'lzma', and 'zstd' or 'lz4' when they are installed
+      level: compression level, the default one of the compressor if None
+      shuffle: if True (default), bytes are shuffled before compression
+      chunk_size: size in bytes of the compressed chunks, 4 MiB by default
+      workers: number of threads compressing and decompressing chunks, the number of CPUs by default
+    """
+
+    mimetype = "application/x-npy-compressed"
+    types = (numpy.ndarray,)
+    extension = ".npc"
+
+    @staticmethod
+    def can_apply(obj):
+        return isinstance(obj, numpy.ndarray)
+
+    @classmethod
+    def encode(cls, obj, storage, **options):
+        name = storage.new_name(cls.extension)
+        with storage.open(name, "wb") as fp:
+            ret = cls.write(obj, fp, **options)
+            ret['$length$'] = fp.tell()
+        ret['$path$'] = storage.location(name)
+        return ret
+
+    @classmethod
+    def write(cls, obj, fp, compression='zlib', level=None, shuffle=True, chunk_size=1 << 22, workers=None,
+              **_options):
+        if obj.dtype.hasobject:
+            raise ValueError("mimejson: arrays of python objects can not be compressed")
+        if compression not in COMPRESSORS:
+            raise ValueError("mimejson: unknown compression %r" % (compression,))
+        data, fortran_order = _flat_bytes(obj)
+        itemsize = max(obj.dtype.itemsize, 1)
+        chunk_size = max(chunk_size // itemsize, 1) * itemsize
+
+        def _compress(i):
+            return compress_chunk(data[i * chunk_size:(i + 1) * chunk_size], itemsize, compression, level, shuffle)
+
+        chunks = write_chunks(fp, _compress, -(-data.size // chunk_size), workers)
+        return {'$mimetype$': cls.mimetype, '$dtype$': numpy.lib.format.dtype_to_descr(obj.dtype),
+                '$shape$': list(obj.shape), '$fortran_order$': fortran_order, '$compression$': compression,
+                '$level$': level, '$shuffle$': bool(shuffle), '$chunk_size$': chunk_size, '$chunks$': chunks}
+
+    @staticmethod
+    def digest(obj):
+        return _NpySerializer.digest(obj)
+
+    @classmethod
+    def decode(cls, obj, filepath, **options):
+        with open(filepath, 'rb') as fp:
+            if os.fstat(fp.fileno()).st_size == 0:
+                return cls.read(obj, b"", **options)
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return cls.read(obj, buf, **options)
+
+    @staticmethod
+    def read(obj, buf, workers=None, **_options):
+        dtype = numpy.lib.format.descr_to_dtype(obj['$dtype$'])
+        fortran_order = obj['$fortran_order$']
+        array = numpy.empty(obj['$shape$'], dtype=dtype, order='F' if fortran_order else 'C')
+        out = array.reshape(-1, order='F' if fortran_order else 'C').view(numpy.uint8)
+        itemsize = max(dtype.itemsize, 1)
+        chunk_size = obj['$chunk_size$']
+        view = memoryview(buf)
+
+        offsets = []
+        offset = 0
+        for length in obj['$chunks$']:
+            offsets.append((offset, length))
+            offset += length
+
+        def _decompress(i):
+            offset, length = offsets[i]
+            decompress_chunk(view[offset:offset + length], out[i * chunk_size:(i + 1) * chunk_size], itemsize,
+                             obj['$compression$'], obj['$shuffle$'])
+
+        try:
+            read_chunks(_decompress, len(offsets), workers)
+        finally:
+            view.release()
+        return array
@@ -28,31 +28,47 @@
 # SUCH DAMAGE.
 # |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
 # ############################################################################
-import os
-import uuid
+import io
 
-import PIL.JpegImagePlugin
+import PIL.Image
+import PIL.PngImagePlugin
 
 
 class Serializer:
     """
     MIMEJSON serializer that allows to dump and load PNG images attached to objects.
+
+    Every PIL image that is not a JPEG image is stored as PNG. Options:
+      compress_level: zlib compression level, from 0 (fastest) to 9 (smallest), 6 by default
+      optimize: if True, search for the smallest encoding, at the cost of speed
     """
 
     mimetype = "image/png"
+    types = (PIL.PngImagePlugin.PngImageFile, PIL.Image.Image)
+    extension = ".png"
 
     @staticmethod
     def can_apply(obj):
-        return hasattr(obj, "__class__") and obj.__class__ in \
-            [PIL.PngImagePlugin.PngImageFile, PIL.Image.Image]
+        return isinstance(obj, PIL.Image.Image) and obj.format != "JPEG"
+
+    @classmethod
+    def encode(cls, obj, storage, **options):
+        name = storage.new_name(cls.extension)
+        with storage.open(name, "wb") as fp:
+            ret = cls.write(obj, fp, **options)
+            ret['$length$'] = fp.tell()
+        ret['$path$'] = storage.location(name)
+        return ret
 
     @classmethod
-    def encode(cls, obj, pathdir):
-        fn = os.path.join(pathdir, "%s.png" % (uuid.uuid1(),))
-        obj.save(fn)
-        return {'$path$': fn, '$length$': os.stat(fn).st_size,
-                '$mimetype$': cls.mimetype}
+    def write(cls, obj, fp, compress_level=6, optimize=False, **_options):
+        obj.save(fp, format="PNG", compress_level=compress_level, optimize=optimize)
+        return {'$mimetype$': cls.mimetype}
+
+    @staticmethod
+    def decode(obj, filepath, **_options):
+        return PIL.Image.open(filepath)
 
     @staticmethod
-    def decode(obj, pathdir):
-        return PIL.Image.open(os.path.join(pathdir, obj['$path$']))
+    def read(obj, buf, **_options):
+        return PIL.Image.open(io.BytesIO(buf))
@@ -28,61 +28,163 @@
 # SUCH DAMAGE.
 # |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
 # ############################################################################
-import functools
+import itertools
 import os
+import tempfile
+import threading
 
-import cv2.cv as cv
+import cv2
+
+from ..video import Video
+
+SEEK_DISTANCE = 16  # < frames skipped by decoding rather than by seeking
+
+
+class VideoFrames(Video):
+
+    """
+    Lazy sequence of the frames of a stored video.
+
+    Frames are decoded when accessed. Slices are views of the video, `[start:stop:step]` seeks to
+    start and then reads frames in sequence, decoding only the selected ones when possible. The video
+    file is open from the creation of the sequence, and shared by its views.
+    """
+
+    def __init__(self, capture, fps, fourcc, frames, frame_size, selection=None, _state=None):
+        Video.__init__(self, self, fps, fourcc)
+        self.frame_size = frame_size
+        self.frame_count = frames
+        self.selection = selection if selection is not None else range(frames)
+        self._state = _state or {'capture': capture, 'position': 0, 'lock': threading.Lock()}
+
+    def __len__(self):
+        return len(self.selection)
+
+    def __repr__(self):
+        return "VideoFrames(%d frames, fps=%r, fourcc=%r, frame_size=%r)" % (len(self), self.fps, self.fourcc,
+                                                                             self.frame_size)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return VideoFrames(None, self.fps, self.fourcc, self.frame_count, self.frame_size,
+                               self.selection[key], self._state)
+        return self._read(self.selection[key])
+
+    def __iter__(self):
+        for index in self.selection:
+            yield self._read(index)
+
+    def _read(self, index):
+        state = self._state
+        with state['lock']:
+            capture = state['capture']
+            skip = index - state['position']
+            if 0 <= skip <= SEEK_DISTANCE:
+                for _ in range(skip):
+                    capture.grab()
+            else:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ok, frame = capture.read()
+            if not ok:
+                state['position'] = -1
+                raise IndexError("mimejson: frame %d can not be read" % (index,))
+            state['position'] = index + 1
+            return frame
+
+    def release(self):
+        """
+        Close the video file.
+        """
+        self._state['capture'].release()
+
+
+def _open(obj, filepath):
+    capture = cv2.VideoCapture(filepath)
+    if not capture.isOpened():
+        raise IOError("mimejson: unable to open video %s" % (filepath,))
+    frames = obj.get('$frame_count$')
+    if frames is None:
+        frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = obj.get('$fps$') or capture.get(cv2.CAP_PROP_FPS)
+    fourcc = obj.get('$fourcc$')
+    if fourcc is None:
+        code = int(capture.get(cv2.CAP_PROP_FOURCC))
+        fourcc = "".join(chr((code >> 8 * i) & 0xFF) for i in range(4))
+    frame_size = obj.get('$frame_size$') or [int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                             int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))]
+    return VideoFrames(capture, fps, fourcc, frames, tuple(frame_size))
 
 
 class Serializer:
-    mimetype = (
-        "video/FMP4",
-        "video/DIVX"
-    )
+    """
+    MIMEJSON serializer of videos, with OpenCV.
+
+    `mimejson.video.Video` objects are encoded with `cv2.VideoWriter` in an AVI file, frame by frame
+    from their iterable of frames. They are decoded as `VideoFrames` sequences, reading frames on demand
+    with `cv2.VideoCapture`. The legacy video/FMP4 and video/DIVX envelopes are decoded in the same way.
+    """
+
+    mimetype = ("video/FMP4", "video/DIVX", "video/x-msvideo")
+    types = (Video,)
+    extension = ".avi"
 
     @staticmethod
     def can_apply(obj):
-        frames = None
-        required = ("$name$", "$fps$", "$encodage$",
-                    "$frame_size$", "$color$", "$frames_list$")
-        if not isinstance(obj, dict):
-            return False
-        for check in required:
-            if check not in obj:
-                return False
-        frames = obj["$frames_list$"]
-        if frames is None or not isinstance(frames, list):
-            return False
-        for frame in frames:
-            if not isinstance(frame, cv.iplimage):
-                return False
-        return True
+        return isinstance(obj, Video)
+
+    @classmethod
+    def encode(cls, obj, storage, **_options):
+        name = storage.new_name(cls.extension)
+        local = storage.local_path(name)
+        fn = local
+        if local is None:
+            # OpenCV only writes files, copied to storages without files
+            fd, fn = tempfile.mkstemp(suffix=cls.extension)
+            os.close(fd)
+        try:
+            ret = cls._write_file(obj, fn)
+            if local is None:
+                with open(fn, 'rb') as fp:
+                    storage.put(name, fp.read())
+        finally:
+            if local is None:
+                os.unlink(fn)
+        ret['$path$'] = storage.location(name)
+        return ret
 
     @classmethod
-    def serialize(cls, obj, pathdir):
-        fn = os.path.join(pathdir, obj["$name$"])
-        writer = cv.CreateVideoWriter(fn, obj["$encodage$"], obj["$fps$"],
-                                      obj["$frame_size$"], obj["$color$"])
-        write = functools.partial(cv.WriteFrame, writer)
-        map(write, obj["$frames_list$"])
-        return {'$path$': fn, '$length$': os.stat(fn).st_size,
-                '$mimetype$': obj["$mimetype$"]}
+    def _write_file(cls, obj, fn):
+        frames = iter(obj)
+        try:
+            first = next(frames)
+        except StopIteration:
+            raise ValueError("mimejson: videos must have at least one frame")
+        height, width = first.shape[:2]
+        color = first.ndim == 3
+        writer = cv2.VideoWriter(fn, cv2.VideoWriter_fourcc(*obj.fourcc), obj.fps, (width, height), color)
+        if not writer.isOpened():
+            raise IOError("mimejson: unable to write %s video %s" % (obj.fourcc, fn))
+        count = 0
+        try:
+            for frame in itertools.chain([first], frames):
+                writer.write(frame)
+                count += 1
+        finally:
+            writer.release()
+        return {'$mimetype$': cls.mimetype[-1], '$length$': os.stat(fn).st_size, '$fourcc$': obj.fourcc,
+                '$fps$': obj.fps, '$frame_size$': [width, height], '$frame_count$': count, '$color$': color}
 
     @staticmethod
-    def deserialize(obj, filepath):
-        video = cv.CaptureFromFile(obj["$path$"])
-        obj["$frames_list$"] = []
-        obj["$color$"] = 1
-        obj["$name$"] = os.path.basename(obj["$path$"])
-        obj["$fps$"] = int(cv.GetCaptureProperty(video, cv.CV_CAP_PROP_FPS))
-        obj["$encodage$"] = int(cv.GetCaptureProperty(video,
-                                                      cv.CV_CAP_PROP_FOURCC))
-        f_w = int(cv.GetCaptureProperty(video, cv.CV_CAP_PROP_FRAME_WIDTH))
-        f_h = int(cv.GetCaptureProperty(video, cv.CV_CAP_PROP_FRAME_HEIGHT))
-        obj["$frame_size$"] = (f_w, f_h)
-        del obj["$path$"]
-        nu_frame = cv.GetCaptureProperty(video, cv.CV_CAP_PROP_FRAME_COUNT)
-        for i in range(int(nu_frame)):
-            frame = cv.QueryFrame(video)
-            obj["$frames_list$"].append(cv.CloneImage(frame))
-        return obj
+    def decode(obj, filepath, **_options):
+        return _open(obj, filepath)
+
+    @classmethod
+    def read(cls, obj, buf, **_options):
+        # OpenCV only reads files, which remain readable once open and removed
+        fd, fn = tempfile.mkstemp(suffix=cls.extension)
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(buf)
+            return _open(obj, fn)
+        finally:
+            os.unlink(fn)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python2
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD 2014-2016
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+"""
+Encoding of multipart/form-data bodies.
+"""
+import json
+import os
+import uuid
+
+CHUNK_SIZE = 1 << 20
+
+
+def _file_length(fp):
+    """
+    Return the number of bytes remaining to be read from a file.
+    """
+    pos = fp.tell()
+    end = fp.seek(0, os.SEEK_END)
+    fp.seek(pos)
+    return end - pos
+
+
+class MultipartBody(object):
+
+    """
+    multipart/form-data body made of form fields and files, streamed from the files.
+
+    Values of fields that are not strings are encoded as JSON. Each part has a Content-Length header.
+    The body can be iterated over by chunks, or read as a file.
+    """
+
+    def __init__(self, fields, files, boundary=None):
+        """
+        Create a multipart body.
+
+        :param fields: dict of form fields
+        :param files: dict of binary file objects, or of (binary file object, length) tuples, indexed by part name
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        self.content_type = "multipart/form-data; boundary=%s" % (self.boundary,)
+        self._segments = []
+        for name, value in (fields or {}).items():
+            if isinstance(value, str):
+                value = value.encode('utf-8')
+            elif not isinstance(value, bytes):
+                value = json.dumps(value).encode('utf-8')
+            self._segments.append(self._part_header(name, None, len(value)) + value + b"\r\n")
+        for name, fp in (files or {}).items():
+            if isinstance(fp, tuple):
+                fp, length = fp
+            else:
+                length = _file_length(fp)
+            filename = os.path.basename(getattr(fp, 'name', None) or name)
+            self._segments.append(self._part_header(name, filename, length))
+            self._segments.append((fp, length))
+            self._segments.append(b"\r\n")
+        self._segments.append(("--%s--\r\n" % (self.boundary,)).encode('ascii'))
+        self.length = sum(len(s) if isinstance(s, bytes) else s[1] for s in self._segments)
+        self._chunks = None
+        self._pending = b""
+
+    def _part_header(self, name, filename, length):
+        disposition = 'form-data; name="%s"' % (name,)
+        header = "--%s\r\n" % (self.boundary,)
+        if filename is not None:
+            disposition += '; filename="%s"' % (filename,)
+            header += "Content-Disposition: %s\r\nContent-Type: application/octet-stream\r\n" % (disposition,)
+        else:
+            header += "Content-Disposition: %s\r\n" % (disposition,)
+        header += "Content-Length: %d\r\n\r\n" % (length,)
+        return header.encode('utf-8')
+
+    def segments(self):
+        """
+        Iterate over the segments of the body.
+
+        :return: an iterator over bytes, and (file, length) tuples for the content of the files
+        """
+        return iter(self._segments)
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        """
+        Read the body as a file.
+        """
+        if self._chunks is None:
+            self._chunks = iter(self)
+        if size is None or size < 0:
+            data = bytes(self._pending) + b"".join(self._chunks)
+            self._pending = b""
+            return data
+        if not self._pending:
+            self._pending = memoryview(next(self._chunks, b""))
+        data = bytes(self._pending[:size])
+        self._pending = self._pending[size:]
+        return data
+
+    def __iter__(self):
+        """
+        Iterate over the chunks of the body, reading files by chunks.
+        """
+        for segment in self._segments:
+            if isinstance(segment, bytes):
+                yield segment
+                continue
+            fp, remaining = segment
+            while remaining > 0:
+                chunk = fp.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError("mimejson: %r is shorter than expected" % (fp,))
+                remaining -= len(chunk)
+                yield chunk
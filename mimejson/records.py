@@ -0,0 +1,321 @@
+#!/usr/bin/env python2
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD 2014-2016
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+"""
+Append-only streams of MIMEJSON records.
+
+A stream is a segment file of newline-delimited MIMEJSON documents, one record per line, with two
+sibling files:
+
+    <segment>.blobs/   the objects attached to the records, referred to by a `$path$` relative to the
+                       directory of the segment, so that the stream can be moved or copied as a whole
+                       (external files referred to by codecs are copied there)
+    <segment>.idx      the offsets of the records in the segment, as little-endian 64 bit integers,
+                       used to seek to a record by number
+
+Records are appended by a `RecordWriter`, and read one by one, or by number, by a `RecordReader`.
+A writer reopening a stream drops a partial last record and rebuilds an index that does not match
+the segment, as left by an interrupted writer.
+"""
+import os
+import shutil
+import struct
+
+from .mimejson import MIMEJSON
+from .storage import DirectoryStorage
+
+_OFFSET = struct.Struct("<Q")
+
+
+def _scan(fp, start=0):
+    """
+    Iterate over the offsets of the lines of a binary file, from start.
+    """
+    fp.seek(start)
+    offset = start
+    for line in fp:
+        yield offset
+        offset += len(line)
+
+
+class _StreamSerializer(MIMEJSON):
+
+    """
+    MIMEJSON serialiser of a stream, whose envelopes refer to the blobs relative to the directory of the segment.
+    """
+
+    def __init__(self, base, blobs, **options):
+        """
+        Create the serialiser of a stream.
+
+        :param base: directory of the segment
+        :param blobs: directory of the attached objects
+        """
+        MIMEJSON.__init__(self, storage=DirectoryStorage(blobs), **options)
+        self.base = base
+
+    def _encode_blob(self, codec, obj, bundle=None):
+        return self._relocate(MIMEJSON._encode_blob(self, codec, obj, bundle))
+
+    def _lazy_envelope(self, obj, bundle=None):
+        ret = MIMEJSON._lazy_envelope(self, obj, bundle)
+        if ret is not None:
+            ret = self._relocate(ret)
+        return ret
+
+    def _relocate(self, envelope):
+        """
+        Make the path of a stored object relative to the directory of the segment, copying it to the blobs if needed.
+        """
+        location = envelope.get('$path$')
+        if location is not None and not location.startswith("http"):
+            if self.storage.lookup(location) is None:
+                location = self._copy_file(location)
+            envelope['$path$'] = os.path.relpath(location, self.base)
+        return envelope
+
+    def _copy_file(self, path):
+        """
+        Copy an external file to the blobs, so that the stream is self-contained.
+
+        :return: the location of the copy
+        """
+        name = self.storage.new_name(os.path.splitext(path)[1])
+        with open(path, 'rb') as src, self.storage.open(name, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        return self.storage.location(name)
+
+    def _decode_envelope(self, obj, segments=None, stacks=None):
+        path = obj.get('$path$')
+        if path is not None and not path.startswith("http") and not os.path.isabs(path):
+            obj = dict(obj, **{'$path$': os.path.join(self.base, path)})
+        return MIMEJSON._decode_envelope(self, obj, segments, stacks)
+
+
+class RecordWriter(object):
+
+    """
+    Writer appending MIMEJSON records to a stream.
+    """
+
+    def __init__(self, path, blobs=None, **options):
+        """
+        Open a stream for appending, creating it if needed.
+
+        :param path: path of the segment file
+        :param blobs: directory of the attached objects, `<path>.blobs` by default
+        :param options: keyword arguments of the MIMEJSON serialiser encoding the records, such as
+            codec_options, inline_threshold, content_addressed or json_backend
+        """
+        self.path = os.path.abspath(path)
+        self.base = os.path.dirname(self.path)
+        self.mj = _StreamSerializer(self.base, os.path.abspath(blobs or self.path + ".blobs"), **options)
+        self.mj.__enter__()
+        self._fp = open(self.path, 'ab')
+        self._index = open(self.path + ".idx", 'ab')
+        self._recover()
+
+    def _recover(self):
+        """
+        Truncate a partial last record, and rebuild the index if it does not match the segment.
+        """
+        size = self._fp.tell()
+        with open(self.path, 'rb') as fp:
+            if size:
+                fp.seek(size - 1)
+                if fp.read(1) != b"\n":
+                    # the last record was not fully written
+                    fp.seek(0)
+                    end = 0
+                    for offset in _scan(fp):
+                        end = offset
+                    self._fp.truncate(end)
+                    self._fp.seek(end)
+                    size = end
+
+            count = self._index.tell() // _OFFSET.size
+            if self._index.tell() == count * _OFFSET.size and self._last_record_ends_at(fp, count, size):
+                self.count = count
+                return
+
+            self._index.truncate(0)
+            self._index.seek(0)
+            self.count = 0
+            for offset in _scan(fp):
+                self._index.write(_OFFSET.pack(offset))
+                self.count += 1
+            self._index.flush()
+
+    def _last_record_ends_at(self, fp, count, size):
+        if count == 0:
+            return size == 0
+        with open(self.path + ".idx", 'rb') as index:
+            index.seek((count - 1) * _OFFSET.size)
+            offset = _OFFSET.unpack(index.read(_OFFSET.size))[0]
+        fp.seek(offset)
+        return offset < size and offset + len(fp.readline()) == size
+
+    def append(self, obj):
+        """
+        Encode an object, store its attached objects and append it to the stream.
+
+        :return: the number of the record
+        """
+        data = self.mj._mimejson_encode_object(obj)
+        offset = self._fp.tell()
+        self._fp.write(self.mj._json_dumps(data, binary=True) + b"\n")
+        self._index.write(_OFFSET.pack(offset))
+        self.count += 1
+        return self.count - 1
+
+    def extend(self, objs):
+        """
+        Append objects to the stream.
+        """
+        for obj in objs:
+            self.append(obj)
+
+    def __len__(self):
+        return self.count
+
+    def flush(self):
+        """
+        Flush the records appended to the segment and to the index.
+        """
+        self._fp.flush()
+        self._index.flush()
+
+    def close(self):
+        """
+        Flush the records, and close the stream.
+        """
+        if self._fp is None:
+            return
+        self.flush()
+        self._fp.close()
+        self._index.close()
+        self._fp = None
+        self.mj.__exit__(None, None, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        self.close()
+
+
+class RecordReader(object):
+
+    """
+    Reader of the MIMEJSON records of a stream.
+
+    Records are read from the segment one at a time, iterating over a stream holds one record in
+    memory whatever its length.
+    """
+
+    def __init__(self, path, lazy=False, **options):
+        """
+        Open a stream for reading.
+
+        :param path: path of the segment file
+        :param lazy: if True, attached objects are returned as `LazyBlob` proxies decoded on first access
+        :param options: keyword arguments of the MIMEJSON serialiser decoding the records, such as
+            codec_options or json_backend
+        """
+        self.path = os.path.abspath(path)
+        self.base = os.path.dirname(self.path)
+        self.lazy = lazy
+        self.mj = _StreamSerializer(self.base, self.path + ".blobs", **options)
+        self._fp = open(self.path, 'rb')
+        self._index = open(self.path + ".idx", 'rb')
+
+    def decode(self, line):
+        """
+        Decode a line of the segment.
+        """
+        return self.mj.loadd(self.mj._json_loads(line), self.lazy)
+
+    def __len__(self):
+        """
+        Return the number of records indexed, records being appended may not be indexed yet.
+        """
+        return os.fstat(self._index.fileno()).st_size // _OFFSET.size
+
+    def offset(self, n):
+        """
+        Return the offset of a record in the segment.
+        """
+        count = len(self)
+        if n < 0:
+            n += count
+        if not 0 <= n < count:
+            raise IndexError("mimejson: record %d out of range" % (n,))
+        return _OFFSET.unpack(os.pread(self._index.fileno(), _OFFSET.size, n * _OFFSET.size))[0]
+
+    def __getitem__(self, n):
+        """
+        Read a record by number.
+        """
+        self._fp.seek(self.offset(n))
+        return self.decode(self._fp.readline())
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, start=0):
+        """
+        Iterate over the records of the stream.
+
+        :param start: number of the first record
+        :return: an iterator over the decoded records
+        """
+        if start and start >= len(self):
+            return
+        with open(self.path, 'rb') as fp:
+            fp.seek(self.offset(start) if start else 0)
+            for line in fp:
+                if not line.endswith(b"\n"):
+                    # record being appended
+                    return
+                yield self.decode(line)
+
+    def close(self):
+        """
+        Close the stream.
+        """
+        self._fp.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        self.close()
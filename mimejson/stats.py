@@ -0,0 +1,164 @@
+#!/usr/bin/env python2
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD 2014-2016
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+"""
+Instrumentation of MIMEJSON serialisers.
+
+Measures are grouped by category and name:
+
+    codec.encode / <mimetype>       codec calls encoding objects, bytes of the objects (in) and of their
+                                    encoded form (out)
+    codec.decode / <mimetype>       codec calls decoding objects, bytes of their encoded form (in) and of
+                                    the objects (out), downloads of remote objects included
+    codec.import / <module>         lazy imports of codec modules, by `CodecRegister`, measured by the
+                                    first instrumented MIMEJSON serialiser (see `MIMEJSON.__init__`)
+    walk / encode, decode           walks of documents, codec calls included
+    json / dumps, loads             JSON encoding (bytes out) and parsing (bytes in)
+    transport / upload, download    HTTP queries (bytes out) and downloads (bytes in)
+
+Instrumentation is disabled unless an `Instrumentation` is given to MIMEJSON (or to a transport or
+codec register), the instrumented code then only checks that it has none.
+"""
+import contextlib
+import threading
+import time
+
+
+class _Span(object):
+
+    """
+    Measure in progress, whose byte counts can be set in its context.
+    """
+
+    __slots__ = ('bytes_in', 'bytes_out')
+
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+
+def nbytes(obj):
+    """
+    Return the size in bytes of an object when known (arrays, buffers), 0 otherwise.
+    """
+    n = getattr(obj, 'nbytes', None)
+    if isinstance(n, int):
+        return n
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    return 0
+
+
+_NO_SPAN = contextlib.nullcontext(_Span())
+
+
+def span(instrumentation, category, name):
+    """
+    Return a span of an instrumentation, or a context doing nothing when instrumentation is None.
+    """
+    if instrumentation is None:
+        return _NO_SPAN
+    return instrumentation.span(category, name)
+
+
+class Instrumentation(object):
+
+    """
+    Counters of calls, bytes and wall time, reported by snapshot or to callbacks.
+    """
+
+    def __init__(self, callbacks=()):
+        """
+        Create an instrumentation.
+
+        :param callbacks: functions called with (category, name, seconds, bytes_in, bytes_out) after
+            each measure
+        """
+        self.callbacks = list(callbacks)
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def add_callback(self, callback):
+        """
+        Add a function called after each measure.
+        """
+        self.callbacks.append(callback)
+
+    def record(self, category, name, seconds, bytes_in=0, bytes_out=0):
+        """
+        Record a measure.
+        """
+        with self._lock:
+            counter = self._counters.get((category, name))
+            if counter is None:
+                counter = self._counters[(category, name)] = [0, 0, 0, 0.0]
+            counter[0] += 1
+            counter[1] += bytes_in
+            counter[2] += bytes_out
+            counter[3] += seconds
+        for callback in self.callbacks:
+            callback(category, name, seconds, bytes_in, bytes_out)
+
+    @contextlib.contextmanager
+    def span(self, category, name):
+        """
+        Measure the wall time of a context, recorded when leaving it.
+
+        The context is given an object whose `bytes_in` and `bytes_out` can be set.
+        """
+        span = _Span()
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.record(category, name, time.perf_counter() - start, span.bytes_in, span.bytes_out)
+
+    def snapshot(self):
+        """
+        Return the counters.
+
+        :return: dict indexed by category of dicts indexed by name of dicts of 'calls', 'bytes_in',
+            'bytes_out' and 'seconds'
+        """
+        with self._lock:
+            counters = [(k, list(v)) for k, v in self._counters.items()]
+        ret = {}
+        for (category, name), (calls, bytes_in, bytes_out, seconds) in counters:
+            ret.setdefault(category, {})[name] = {'calls': calls, 'bytes_in': bytes_in, 'bytes_out': bytes_out,
+                                                  'seconds': seconds}
+        return ret
+
+    def reset(self):
+        """
+        Reset the counters.
+        """
+        with self._lock:
+            self._counters = {}
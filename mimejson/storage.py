@@ -0,0 +1,386 @@
+#!/usr/bin/env python2
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD 2014-2016
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+"""
+Storage backends of the objects attached to MIMEJSON documents.
+
+A storage holds blobs by name, and gives each one a location, the `$path$` of its envelope:
+
+    new_name(extension)   a new unique name
+    open(name, mode)      a binary file, 'rb' or 'wb', whose `name` is the location of the blob
+    put(name, data)       store a blob
+    get(name)             the content of a blob, as a bytes-like object
+    delete(name)          remove a blob
+    rename(name, new)     rename a blob
+    exists(name)          True if a blob is stored under name
+    location(name)        the location of a blob
+    lookup(location)      the name of the blob at a location, None if the location is not in the storage
+    local_path(name)      the path of a blob on the filesystem, None for storages without files
+
+`setup` and `teardown` are called when entering and leaving a MIMEJSON context.
+"""
+import errno
+import io
+import os
+import tempfile
+import uuid
+
+
+class Storage(object):
+
+    """
+    Base class of storage backends.
+    """
+
+    def new_name(self, extension=''):
+        """
+        Return a new unique name, ending with extension.
+        """
+        return "%s%s" % (uuid.uuid1(), extension)
+
+    def open(self, name, mode='rb'):
+        """
+        Open a blob as a binary file, for reading ('rb') or writing ('wb').
+        """
+        raise NotImplementedError
+
+    def put(self, name, data):
+        """
+        Store a blob.
+        """
+        with self.open(name, 'wb') as fp:
+            fp.write(data)
+
+    def get(self, name):
+        """
+        Return the content of a blob, as a bytes-like object.
+        """
+        with self.open(name) as fp:
+            return fp.read()
+
+    def delete(self, name):
+        """
+        Remove a blob.
+        """
+        raise NotImplementedError
+
+    def rename(self, name, new_name):
+        """
+        Rename a blob.
+        """
+        raise NotImplementedError
+
+    def exists(self, name):
+        """
+        Return True if a blob is stored under name.
+        """
+        raise NotImplementedError
+
+    def location(self, name):
+        """
+        Return the location of a blob, the `$path$` of its envelope.
+        """
+        raise NotImplementedError
+
+    def lookup(self, location):
+        """
+        Return the name of the blob at a location, or None if the location is not in the storage.
+        """
+        raise NotImplementedError
+
+    def local_path(self, name):
+        """
+        Return the path of a blob on the filesystem, or None for storages without files.
+        """
+        return None
+
+    def setup(self):
+        """
+        Prepare the storage, when entering a MIMEJSON context.
+        """
+        pass
+
+    def teardown(self):
+        """
+        Clean the storage up, when leaving a MIMEJSON context.
+        """
+        pass
+
+
+class DirectoryStorage(Storage):
+
+    """
+    Blobs stored as files of a directory.
+
+    The storage can be used as a path (`os.fspath`), the one of its directory.
+    """
+
+    def __init__(self, directory, temporary=False):
+        """
+        Create a directory storage.
+
+        :param directory: directory of the blobs, created on setup
+        :param temporary: if True, the directory must not exist on setup, and is removed on teardown
+        """
+        self.directory = directory
+        self.temporary = temporary
+
+    def __fspath__(self):
+        return self.directory
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self.directory)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def open(self, name, mode='rb'):
+        """
+        Open the file of a blob.
+        """
+        return open(self._path(name), mode)
+
+    def delete(self, name):
+        """
+        Remove the file of a blob.
+        """
+        os.unlink(self._path(name))
+
+    def rename(self, name, new_name):
+        """
+        Rename the file of a blob.
+        """
+        os.rename(self._path(name), self._path(new_name))
+
+    def exists(self, name):
+        """
+        Return True if the file of a blob exists.
+        """
+        return os.path.exists(self._path(name))
+
+    def location(self, name):
+        """
+        Return the path of the file of a blob.
+        """
+        return self._path(name)
+
+    def lookup(self, location):
+        """
+        Return the name of the blob of a path in the directory, or None for paths elsewhere.
+        """
+        if os.path.dirname(location) == self.directory:
+            return os.path.basename(location)
+        return None
+
+    def local_path(self, name):
+        """
+        Return the path of the file of a blob.
+        """
+        return self._path(name)
+
+    def setup(self):
+        """
+        Create the directory, which must not exist if the storage is temporary.
+        """
+        if os.path.exists(self.directory) and self.temporary:
+            errmsg = """
+            Temporary folder %s must be a non-existent as it will be deleted on exit
+            """ % (self.directory,)
+            raise Exception(errmsg)
+
+        if not os.path.exists(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST or not os.path.isdir(self.directory):
+                    raise
+            os.chmod(self.directory, 0o700)
+
+    def teardown(self):
+        """
+        Remove the directory and its files if the storage is temporary.
+        """
+        if self.temporary:
+            for f in os.listdir(self.directory):
+                os.unlink(self._path(f))
+            os.rmdir(self.directory)
+
+
+def _is_tmpfs(path):
+    """
+    Return True if path is on a tmpfs filesystem, according to /proc/mounts.
+    """
+    try:
+        with open("/proc/mounts") as fp:
+            mounts = [line.split()[1:3] for line in fp]
+    except IOError:
+        return False
+    path = os.path.realpath(path)
+    best = ("", None)
+    for mountpoint, fstype in mounts:
+        if (path == mountpoint or path.startswith(mountpoint.rstrip("/") + "/")) and len(mountpoint) > len(best[0]):
+            best = (mountpoint, fstype)
+    return best[1] == "tmpfs"
+
+
+class TmpfsStorage(DirectoryStorage):
+
+    """
+    Blobs stored as files of a temporary directory in memory.
+
+    The directory is created in /dev/shm, or in the system temporary directory when it is a tmpfs,
+    and falls back to the system temporary directory otherwise. Blobs are files that codecs can memory
+    map, without going to disk.
+    """
+
+    def __init__(self, directory=None):
+        """
+        Create a tmpfs storage.
+
+        :param directory: directory of the blobs, by default a new directory on a tmpfs
+        """
+        if directory is None:
+            directory = os.path.join(self.tmpfs_root(), ".mjson-%d-%s" % (os.getpid(), uuid.uuid4().hex[:8]))
+        DirectoryStorage.__init__(self, directory, temporary=True)
+
+    @staticmethod
+    def tmpfs_root():
+        """
+        Return a directory on a tmpfs, or the system temporary directory if there is none.
+        """
+        for root in ("/dev/shm", tempfile.gettempdir()):
+            if os.path.isdir(root) and os.access(root, os.W_OK) and _is_tmpfs(root):
+                return root
+        return tempfile.gettempdir()
+
+
+class _MemoryFile(io.BytesIO):
+
+    """
+    Blob of a memory storage being written, stored when closed.
+    """
+
+    def __init__(self, storage, name):
+        """
+        Create a file storing a blob under name when closed.
+        """
+        io.BytesIO.__init__(self)
+        self.storage = storage
+        self.blob = name
+        self.name = storage.location(name)
+
+    def close(self):
+        """
+        Store the blob, and close the file.
+        """
+        if not self.closed:
+            self.storage.put(self.blob, self.getvalue())
+        io.BytesIO.close(self)
+
+
+class MemoryStorage(Storage):
+
+    """
+    Blobs stored as bytes in memory, for documents that do not leave the process.
+
+    Locations are `mem://<id of the storage>/<name>` URIs, only meaningful to the storage itself.
+    """
+
+    def __init__(self):
+        """
+        Create an empty memory storage.
+        """
+        self.blobs = {}
+        self.prefix = "mem://%x/" % (id(self),)
+
+    def __repr__(self):
+        return "%s(%d blobs)" % (type(self).__name__, len(self.blobs))
+
+    def open(self, name, mode='rb'):
+        """
+        Open a blob as an in-memory file, stored when closed if opened for writing.
+        """
+        if 'w' in mode:
+            return _MemoryFile(self, name)
+        return io.BytesIO(self.get(name))
+
+    def put(self, name, data):
+        """
+        Store a copy of a blob.
+        """
+        self.blobs[name] = bytes(data)
+
+    def get(self, name):
+        """
+        Return the content of a blob.
+        """
+        try:
+            return self.blobs[name]
+        except KeyError:
+            raise IOError(errno.ENOENT, "mimejson: no blob %s in memory storage" % (name,))
+
+    def delete(self, name):
+        """
+        Remove a blob, if stored.
+        """
+        self.blobs.pop(name, None)
+
+    def rename(self, name, new_name):
+        """
+        Rename a blob.
+        """
+        self.blobs[new_name] = self.blobs.pop(name)
+
+    def exists(self, name):
+        """
+        Return True if a blob is stored under name.
+        """
+        return name in self.blobs
+
+    def location(self, name):
+        """
+        Return the `mem://` URI of a blob.
+        """
+        return self.prefix + name
+
+    def lookup(self, location):
+        """
+        Return the name of the blob of a URI of the storage, or None for other locations.
+        """
+        if location.startswith(self.prefix):
+            return location[len(self.prefix):]
+        return None
+
+    def teardown(self):
+        """
+        Remove all the blobs.
+        """
+        self.blobs.clear()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python2
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD 2014-2016
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+
+import http.server
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+import mimejson
+import numpy
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.environ.get("MIMEJSON_BENCHMARK"),
+                                reason="benchmarks run with MIMEJSON_BENCHMARK=1")
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+UPDATE = bool(os.environ.get("MIMEJSON_BENCHMARK_UPDATE"))
+LARGE = bool(os.environ.get("MIMEJSON_BENCHMARK_LARGE"))
+
+_counting = [False, 0]
+
+
+def _audit(event, args):
+    # counts the files opened for writing, by python code and by `os.open`
+    if _counting[0] and event == "open":
+        _path, mode, flags = args
+        if mode is not None:
+            writing = any(c in mode for c in "wxa+")
+        else:
+            writing = bool(flags & (os.O_CREAT | os.O_WRONLY | os.O_RDWR))
+        if writing:
+            _counting[1] += 1
+
+
+if os.environ.get("MIMEJSON_BENCHMARK"):
+    sys.addaudithook(_audit)
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as fp:
+            fp.write("5")
+    except IOError:
+        pass
+
+
+def _peak_rss():
+    with open("/proc/self/status") as fp:
+        for line in fp:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+@pytest.fixture(scope="module")
+def baselines():
+    with open(BASELINES) as fp:
+        baselines = json.load(fp)
+    yield baselines
+    if UPDATE:
+        with open(BASELINES, "w") as fp:
+            json.dump(baselines, fp, indent=2, sort_keys=True)
+            fp.write("\n")
+
+
+def _measure(baselines, name, fct, nbytes, repeat=3):
+    """
+    Run a benchmark, report it and compare it with its baseline.
+
+    :param fct: function running the benchmarked operation once
+    :param nbytes: number of bytes processed by the operation, for the throughput
+    """
+    best = None
+    _reset_peak_rss()
+    for i in range(repeat):
+        _counting[:] = [i == 0, 0]
+        start = time.perf_counter()
+        fct()
+        elapsed = time.perf_counter() - start
+        if i == 0:
+            files = _counting[1]
+        _counting[0] = False
+        best = elapsed if best is None else min(best, elapsed)
+    result = {'throughput': nbytes / max(best, 1e-9) / (1 << 20), 'peak_rss': _peak_rss(), 'files': files}
+    sys.stdout.write("\n%-28s %10.1f MB/s %8.1f MB peak RSS %4d files" %
+                     (name, result['throughput'], result['peak_rss'] / float(1 << 20), result['files']))
+
+    if UPDATE:
+        baselines['cases'][name] = dict(result, throughput=round(result['throughput'], 1))
+        return
+    baseline = baselines['cases'].get(name)
+    if baseline is None:
+        pytest.skip("no baseline for %s" % (name,))
+    tolerance = baselines['tolerance']
+    assert result['throughput'] >= baseline['throughput'] * (1 - tolerance['throughput']), (name, result, baseline)
+    assert result['peak_rss'] <= baseline['peak_rss'] * (1 + tolerance['peak_rss']), (name, result, baseline)
+    assert result['files'] <= baseline['files'] + tolerance['files'], (name, result, baseline)
+
+
+def _deep_tree(depth):
+    tree = {'leaf': [1, 2.5, "three", None]}
+    for i in range(depth):
+        tree = {'level': i, 'children': [tree, {'x': i}]}
+    return tree
+
+
+def _wide_tree(width):
+    return dict(("key%d" % i, {'value': i, 'name': "item%d" % i, 'tags': ["a", "b"]}) for i in range(width))
+
+
+@pytest.mark.parametrize("shape", ["deep", "wide"])
+def test_benchmark_json_trees(baselines, shape):
+    data = _deep_tree(400) if shape == "deep" else _wide_tree(100000)
+    with mimejson.MIMEJSON() as mj:
+        encoded = mj.dumps(data)
+        _measure(baselines, "dumps_json_%s" % (shape,), lambda: mj.dumps(data), len(encoded))
+        _measure(baselines, "loads_json_%s" % (shape,), lambda: mj.loads(encoded), len(encoded))
+
+
+@pytest.mark.parametrize("size", [1 << 10, 1 << 20, 1 << 26, 1 << 30])
+def test_benchmark_arrays(baselines, size):
+    if size >= 1 << 30 and not LARGE:
+        pytest.skip("1 GB benchmarks run with MIMEJSON_BENCHMARK_LARGE=1")
+    array = numpy.random.RandomState(0).random_sample(size // 8)
+    repeat = 1 if size >= 1 << 30 else 3
+    with mimejson.MIMEJSON() as mj:
+        encoded = mj.dumps({'a': array})
+        path = json.loads(encoded)['a']['$path$']
+
+        def _dumps():
+            os.unlink(json.loads(mj.dumps({'a': array}))['a']['$path$'])
+
+        _measure(baselines, "dumps_array_%d" % (size,), _dumps, size, repeat)
+        _measure(baselines, "loads_array_%d" % (size,), lambda: mj.loads(encoded), size, repeat)
+        os.unlink(path)
+
+
+@pytest.mark.parametrize("mimetype", ["image/png", "image/jpg"])
+def test_benchmark_images(baselines, mimetype):
+    import PIL.Image
+
+    y, x = numpy.mgrid[0:2048, 0:2048]
+    pixels = numpy.dstack([x % 256, y % 256, (x + y) % 256]).astype(numpy.uint8)
+    image = PIL.Image.fromarray(pixels)
+    if mimetype == "image/jpg":
+        out = io.BytesIO()
+        image.save(out, format="JPEG")
+        image = PIL.Image.open(io.BytesIO(out.getvalue()))
+    name = mimetype.split("/")[1]
+    with mimejson.MIMEJSON() as mj:
+        encoded = mj.dumps({'image': image})
+        _measure(baselines, "dumps_%s" % (name,), lambda: mj.dumps({'image': image}), pixels.nbytes)
+        _measure(baselines, "loads_%s" % (name,), lambda: mj.loads(encoded)['image'].load(), pixels.nbytes)
+
+
+class _Handler(http.server.SimpleHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_args):
+        pass
+
+    def do_POST(self):
+        remaining = int(self.headers['Content-Length'])
+        while remaining > 0:
+            remaining -= len(self.rfile.read(min(remaining, 1 << 20)))
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(tmpdir):
+    handler = lambda *args: _Handler(*args, directory=str(tmpdir))  # noqa: E731
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    yield str(tmpdir), "http://127.0.0.1:%d/" % (httpd.server_address[1],)
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_benchmark_transport(baselines, server):
+    directory, url = server
+    size = 1 << 26
+    data = {'a': numpy.random.RandomState(0).random_sample(size // 8), 'b': {'c': "d"}}
+    with mimejson.MIMEJSON(url) as mj:
+        _measure(baselines, "push_array_%d" % (size,), lambda: mj.push(data, url), size)
+
+        encoded = json.loads(mj.dumps(data))
+        fn = os.path.basename(encoded['a']['$path$'])
+        os.rename(encoded['a']['$path$'], os.path.join(directory, fn))
+        encoded['a']['$path$'] = url + fn
+        with open(os.path.join(directory, "doc.json"), "w") as fp:
+            json.dump(encoded, fp)
+        _measure(baselines, "load_remote_array_%d" % (size,), lambda: mj.load(url + "doc.json"), size)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python2
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD 2014-2016
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+
+import io
+import json
+import os
+
+import mimejson
+import mimejson.jsonlib
+import numpy
+import pytest
+
+DOCUMENTS = [
+    {},
+    [],
+    {'a': 2, 'b': [1, 2.5, -3e-12, True, False, None], 'c': {'d': {'e': [[], {}]}}},
+    {'text': u"café 日本 \U0001f600 \"quoted\" \\ \n\t", u"clé": u"é"},
+    [0, -1, (1 << 63) - 1, -(1 << 63), 0.1, 1e300, 123456789.123456789],
+    {'$mimetype$': 'application/npy', '$path$': '/tmp/a.npy', '$length$': 128},
+    {1: 'a', 2: 'b'},
+]
+
+
+@pytest.fixture(params=sorted(mimejson.jsonlib.BACKENDS))
+def backend(request):
+    if request.param not in mimejson.jsonlib.available_backends():
+        pytest.skip("%s is not installed" % (request.param,))
+    return mimejson.jsonlib.get_backend(request.param)
+
+
+def test_json_backends_are_equivalent_to_the_standard_library(backend):
+    """
+    JSON backends decode the documents they encode, and the documents of other backends, as the standard library does.
+    """
+    for doc in DOCUMENTS:
+        expected = json.loads(json.dumps(doc))
+        encoded = backend.dumps(doc)
+        assert(backend.dumpb(doc) == encoded.encode('utf-8'))
+        assert(backend.loads(encoded) == backend.loads(encoded.encode('utf-8')) == expected)
+        assert(json.loads(encoded) == expected and backend.loads(json.dumps(doc)) == expected)
+
+
+def test_mimejson_json_backends(backend, tmpdir):
+    """
+    MIMEJSON documents encoded with a JSON backend are decoded by the others.
+    """
+    a = numpy.arange(100)
+    data = {'a': a, 'b': [u"é", {'c': 1.5}]}
+    with mimejson.MIMEJSON(json_backend=backend) as mj, mimejson.MIMEJSON(basepath=str(tmpdir)) as reference:
+        encoded = mj.dumps(data)
+        decoded = reference.loads(encoded)
+        assert((decoded['a'] == a).all() and decoded['b'] == data['b'])
+        assert(isinstance(mj.dumpb(data), bytes) and json.loads(mj.dumpb(data))['b'] == data['b'])
+        decoded = mj.loads(reference.dumps(data))
+        assert((decoded['a'] == a).all() and decoded['b'] == data['b'])
+        for doc in DOCUMENTS:
+            assert(''.join(mj.iterencode(doc)) == mj.dumps(doc))
+
+        bundle = io.BytesIO()
+        mj.dump_bundle(data, bundle)
+        bundle.seek(0)
+        with open(os.path.join(str(tmpdir), "doc.mjb"), 'wb') as fp:
+            fp.write(bundle.getvalue())
+        decoded = reference.load_bundle(fp.name)
+        assert((decoded['a'] == a).all() and decoded['b'] == data['b'])
+
+
+def test_json_backend_selection():
+    """
+    The standard library is the default JSON backend, 'auto' selects the fastest backend installed.
+    """
+    assert(mimejson.jsonlib.get_backend().name == 'json')
+    assert(mimejson.jsonlib.get_backend('auto').name == mimejson.jsonlib.available_backends()[0])
+    with pytest.raises(ValueError):
+        mimejson.jsonlib.get_backend('yaml')
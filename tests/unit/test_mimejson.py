@@ -30,12 +30,16 @@
 # |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
 # ############################################################################
 
+import concurrent.futures
+import io
 import json
 import os
+import subprocess
 import sys
 
 import mimejson
 import numpy
+import pytest
 
 sys.path.append(os.getcwd())
 
@@ -75,3 +79,486 @@ def test_mimejson_encodes_large_arrays():
         ea = mj.dumps({'a': a})
         ra = mj.loads(ea)['a']
         assert(((ra - a) == 0).all())
+
+
+def test_mimejson_codec_dispatch_by_type():
+    """
+    MIMEJSON dispatches codecs by type, following the MRO, and skips JSON scalars.
+    """
+    class SubArray(numpy.ndarray):
+        pass
+
+    with mimejson.MIMEJSON() as mj:
+        codec = mj.codecs.lookup(numpy.eye(2))
+        assert(codec is mj.codecs['application/npz'])
+        assert(mj.codecs.lookup(numpy.eye(2).view(SubArray)) is codec)
+        for x in [1, 2.5, "a", True, None, {}, []]:
+            assert(mj.codecs.lookup(x) is None)
+        with open(__file__, 'r') as f:
+            assert(mj.codecs.lookup(f) is mj.codecs['file'])
+
+
+def test_mimejson_walk_shares_unchanged_structures():
+    """
+    MIMEJSON does not copy containers without encoded objects and handles deep documents.
+    """
+    shared = {'b': [1, 2, {'c': "d"}], 'e': (1, 2)}
+    data = {'a': shared, 'f': [numpy.eye(2)]}
+    paths = []
+    encoded = mimejson.mimejson._xmap(data, lambda o, path: paths.append(tuple(path)) or o)
+    assert(encoded is data)
+    assert(('a', 'b', 2, 'c') in paths and ('f', 0) in paths)
+
+    deep = []
+    for _ in range(5 * sys.getrecursionlimit()):
+        deep = [deep]
+    with mimejson.MIMEJSON() as mj:
+        encoded = mj._mimejson_encode_object(data)
+        assert(encoded['a'] is shared)
+        assert(encoded['f'][0]['$mimetype$'] == 'application/npy')
+        assert(mj._mimejson_encode_object(deep) is deep)
+
+        deep = [numpy.eye(2)]
+        for _ in range(40000):
+            deep = [1, deep]
+        encoded = mj._mimejson_encode_object(deep)
+        for _ in range(40000):
+            encoded = encoded[1]
+        assert(encoded[0]['$mimetype$'] == 'application/npy')
+
+
+def test_mimejson_detects_circular_references():
+    """
+    MIMEJSON rejects containers that contain themselves, as json does.
+    """
+    a = []
+    a.append(a)
+    b = {'x': [1, {}]}
+    b['x'][1]['y'] = b
+    shared = [1]
+    with mimejson.MIMEJSON() as mj:
+        for x in (a, b):
+            with pytest.raises(ValueError):
+                mj.dumps(x)
+            with pytest.raises(ValueError):
+                ''.join(mj.iterencode(x))
+        assert(mj.loads(mj.dumps([shared, shared])) == [[1], [1]])
+        assert(''.join(mj.iterencode([shared, {'s': shared}])) == json.dumps([shared, {'s': shared}]))
+
+
+def test_mimejson_iterencode_is_json_equivalent():
+    """
+    MIMEJSON streaming encoder produces the same documents as dumps.
+    """
+    cases = [{}, [], 1, "x", None, {'a': [1, (2, 3), {}, []], 'b': {'c': u"é", 1: 2.5, None: True}}]
+    with mimejson.MIMEJSON() as mj:
+        for x in cases:
+            assert(''.join(mj.iterencode(x)) == json.dumps(x))
+
+        out = io.StringIO()
+        mj.dump({'a': numpy.eye(3), 'b': [numpy.arange(4)]}, out)
+        ra = mj.loads(out.getvalue())
+        assert((ra['a'] == numpy.eye(3)).all() and (ra['b'][0] == numpy.arange(4)).all())
+
+
+def test_mimejson_lazy_loads():
+    """
+    MIMEJSON lazy mode only decodes attached objects when they are accessed.
+    """
+    a = numpy.arange(10)
+    with mimejson.MIMEJSON() as mj:
+        ra = mj.loads(mj.dumps({'a': a, 'b': 1}), lazy=True)
+        assert(ra['b'] == 1)
+        proxy = ra['a']
+        assert(isinstance(proxy, mimejson.LazyBlob) and not proxy.materialized)
+        assert(proxy['$length$'] == proxy.length > a.nbytes)
+        assert(proxy.mimetype == 'application/npy')
+        assert(proxy.shape == a.shape and proxy.materialized)
+        assert((numpy.asarray(proxy) == a).all())
+        assert((proxy.materialize() == a).all())
+        assert((proxy + 1 == a + 1).all() and (2 * proxy == a * 2).all() and (proxy < 5).sum() == 5)
+        assert(3 in proxy and list(reversed(proxy)) == list(a[::-1]) and proxy @ proxy == a @ a)
+
+        ra = mj.loads(mj.dumps({'a': a, 'b': [a * 2], 'f': io.BytesIO(b"xyz")}), lazy=True)
+        ra['b'][0].materialize()
+        for s in (mj.dumps(ra), ''.join(mj.iterencode(ra)), mj.dumps_many([ra, ra])[0]):
+            assert(not ra['a'].materialized and not ra['f'].materialized)
+            rb = mj.loads(s)
+            assert((rb['a'] == a).all() and (rb['b'][0] == a * 2).all())
+            with rb['f'] as fp:
+                assert(fp.read() == "xyz")
+
+
+def test_mimejson_numpy_memory_maps():
+    """
+    MIMEJSON numpy codec stores .npy files and can decode them as memory maps.
+    """
+    arrays = [numpy.arange(12.).reshape(3, 4), numpy.asfortranarray(numpy.arange(12).reshape(3, 4)),
+              numpy.arange(24)[::2], numpy.array(3), numpy.zeros((0, 2))]
+    with mimejson.MIMEJSON(codec_options={'application/npy': {'mmap_mode': 'r'}}) as mj:
+        encoded = json.loads(mj.dumps(arrays))
+        for a, e in zip(arrays, encoded):
+            assert(e['$length$'] == os.stat(e['$path$']).st_size)
+            assert((numpy.load(e['$path$']) == a).all())
+        decoded = mj.loadd(encoded)
+        assert(isinstance(decoded[0], numpy.memmap) and not decoded[0].flags.writeable)
+        assert(all((a == d).all() and a.shape == d.shape for a, d in zip(arrays, decoded)))
+
+
+def test_mimejson_inlines_small_objects():
+    """
+    MIMEJSON embeds objects smaller than the inline threshold in the JSON document.
+    """
+    small, large = numpy.eye(3), numpy.zeros(1000)
+    for encoding in ['base64', 'base85']:
+        with mimejson.MIMEJSON(inline_threshold={'application/npy': 1024}, inline_encoding=encoding) as mj:
+            encoded = json.loads(mj.dumps({'small': small, 'large': large}))
+            assert(encoded['small']['$encoding$'] == encoding and '$path$' not in encoded['small'])
+            assert(encoded['small']['$length$'] < 1024 <= encoded['large']['$length$'])
+            assert(os.listdir(mj.storage) == [os.path.basename(encoded['large']['$path$'])])
+            decoded = mj.loadd(encoded)
+            assert((decoded['small'] == small).all() and decoded['small'].flags.writeable)
+            assert((decoded['large'] == large).all())
+
+
+def test_mimejson_bundle():
+    """
+    MIMEJSON bundles store a document and its objects in one file, decoded from page-aligned segments.
+    """
+    data = {'a': numpy.arange(1000.), 'b': [numpy.eye(3), "c"], 'd': numpy.zeros((2, 0))}
+    # options that a codec does not know are ignored
+    with mimejson.MIMEJSON(codec_options={'application/npy': {'mmap_mode': 'r'}, 'file': {'mmap_mode': 'r'}}) as mj:
+        fn = os.path.join(mj.storage, "test.mjb")
+        external = os.path.join(mj.storage, "external.txt")
+        with open(external, 'w') as fp:
+            fp.write("g")
+        with open(external, 'rb') as fp:
+            mj.dump_bundle(dict(data, e=io.BytesIO(b"f"), g=fp), fn)
+        assert(sorted(os.listdir(mj.storage)) == ["external.txt", "test.mjb"])
+        header, start = mimejson.bundle.read_header(open(fn, 'rb').read())
+        assert(json.loads(header.decode('utf-8'))['a']['$offset$'] % mimejson.bundle.PAGE_SIZE == 0)
+        assert(start % mimejson.bundle.PAGE_SIZE == 0)
+
+        decoded = mj.load_bundle(fn)
+        assert(not decoded['a'].flags.owndata and not decoded['a'].flags.writeable)
+        assert((decoded['a'] == data['a']).all() and (decoded['b'][0] == data['b'][0]).all())
+        assert(decoded['b'][1] == "c" and decoded['d'].shape == (2, 0))
+        assert(decoded['e'].read() == "f" and decoded['g'].read() == "g")
+        decoded['e'].close()
+        decoded['g'].close()
+        assert((mj.load_bundle(fn, lazy=True)['b'][0].materialize() == data['b'][0]).all())
+
+
+def test_mimejson_content_addressed_storage():
+    """
+    MIMEJSON content addressed mode stores identical objects once.
+    """
+    a = numpy.arange(100)
+    with mimejson.MIMEJSON(content_addressed=True) as mj:
+        encoded = json.loads(mj.dumps([a, a, a.copy(), numpy.asfortranarray(a), a + 1]))
+        assert(len(set(e['$path$'] for e in encoded)) == 2 and len(os.listdir(mj.storage)) == 2)
+        assert(json.loads(mj.dumps({'a': a}))['a'] == encoded[0])
+        decoded = mj.loadd(encoded)
+        assert((decoded[1] == a).all() and (decoded[4] == a + 1).all())
+        a[0] = 1
+        assert(json.loads(mj.dumps({'a': a}))['a'] != encoded[0])
+
+
+def test_mimejson_concurrent_encoding():
+    """
+    MIMEJSON encodes and decodes objects concurrently when given workers.
+    """
+    data = {'a': [numpy.arange(i) for i in range(20)], 'b': {'c': numpy.eye(4), 'd': 1}}
+    with mimejson.MIMEJSON(workers=4) as mj:
+        parts = {}
+        encoded = mj._mimejson_encode_object(data, parts)
+        assert(encoded['b']['d'] == 1 and encoded['b']['c']['$mimetype$'] == 'application/npy')
+        assert(sorted(parts) == ['a.%d' % i for i in sorted(range(20), key=str)] + ['c'])
+        for f, length in parts.values():
+            assert(os.fstat(f.fileno()).st_size == length)
+            f.close()
+        decoded = mj.loadd(encoded)
+        assert(all((x == y).all() for x, y in zip(decoded['a'], data['a'])))
+        assert((decoded['b']['c'] == data['b']['c']).all())
+
+        parts = {}
+        mj._mimejson_encode_object({'x': {'img': numpy.eye(2)}, 'y': {'img': numpy.eye(3)}}, parts)
+        assert(sorted(parts) == ['img', 'y.img'])
+        for f, _length in parts.values():
+            f.close()
+
+    with concurrent.futures.ProcessPoolExecutor(1) as pool:
+        with pytest.raises(TypeError):
+            mimejson.MIMEJSON(executor=pool)
+
+
+def test_mimejson_storage_backends(tmpdir):
+    """
+    MIMEJSON stores objects in memory or on a tmpfs through storage backends.
+    """
+    data = {'a': numpy.arange(100), 'b': [numpy.eye(3), io.BytesIO(b"content")]}
+    storage = mimejson.MemoryStorage()
+    for content_addressed in [False, True]:
+        with mimejson.MIMEJSON(storage=storage, content_addressed=content_addressed) as mj:
+            encoded = json.loads(mj.dumps(data))
+            assert(encoded['a']['$path$'].startswith("mem://") and len(storage.blobs) == 3)
+            decoded = mj.loadd(encoded)
+            assert((decoded['a'] == data['a']).all() and (decoded['b'][0] == data['b'][0]).all())
+            assert(decoded['b'][1].read() == "content")
+            data['b'][1] = io.BytesIO(b"content")
+            assert((mj.loads(mj.dumps(data), lazy=True)['a'].materialize() == data['a']).all())
+            data['b'][1] = io.BytesIO(b"content")
+        assert(storage.blobs == {})
+
+    storage = mimejson.TmpfsStorage()
+    with mimejson.MIMEJSON(storage=storage) as mj:
+        encoded = json.loads(mj.dumps(data))
+        assert(os.path.dirname(encoded['a']['$path$']) == storage.directory)
+        assert((mj.loadd(encoded)['a'] == data['a']).all())
+    assert(not os.path.exists(storage.directory))
+
+    mj = mimejson.MIMEJSON()
+    mj.storage = str(tmpdir)
+    with mj:
+        assert(isinstance(mj.storage, mimejson.storage.DirectoryStorage) and not mj.storage.temporary)
+        encoded = json.loads(mj.dumps({'a': numpy.eye(2)}))
+        assert(os.path.dirname(encoded['a']['$path$']) == str(tmpdir))
+    mj.storage = storage
+    assert(mj.storage is storage)
+
+
+def test_mimejson_codecs_are_imported_lazily(caplog):
+    """
+    MIMEJSON imports codecs declared in its manifest only when their types or mimetypes are met.
+    """
+    code = ("import sys, mimejson\n"
+            "with mimejson.MIMEJSON() as mj:\n"
+            "    mj.loads(mj.dumps({'a': [1, {'b': 'c'}]}))\n"
+            "assert not [m for m in sys.modules if m.startswith(('PIL', 'numpy', 'mimejson.mimetype.'))\n"
+            "           and m != 'mimejson.mimetype.file'], sys.modules\n")
+    subprocess.check_call([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(mimejson.__file__)))
+
+    register = mimejson.CodecRegister()
+    register.add_manifest(mimejson.mimetype.MANIFEST)
+    register.add_manifest([{'module': 'mimejson.mimetype.missing', 'mimetypes': ('application/x-missing',)}])
+    assert('application/x-missing' in list(register.all_codecs) and not register.all_codecs._codecs)
+    assert(register.lookup(numpy.eye(2)) is register['application/npy'])
+    for entry in mimejson.mimetype.MANIFEST:
+        if entry['mimetypes'][0] in register.all_codecs:
+            codec = register[entry['mimetypes'][0]]
+            assert(set(entry['mimetypes']) == set(codec.mimetype if isinstance(codec.mimetype, tuple)
+                                                  else (codec.mimetype,)))
+            assert(entry.get('types', ()) == tuple(mimejson.codec._qualified_name(t)
+                                                   for t in getattr(codec, 'types', ())))
+    assert('application/x-missing' not in register.all_codecs)
+    assert("mimejson.mimetype.missing" in caplog.text)
+
+
+def test_mimejson_compressed_arrays():
+    """
+    MIMEJSON compresses arrays in shuffled chunks with the codec preferred to the default one.
+    """
+    labels = numpy.zeros((300, 200), dtype=numpy.int32)
+    labels[100:150, 50:120] = 7
+    arrays = [labels, numpy.asfortranarray(numpy.linspace(0, 1, 60000).reshape(200, 300)),
+              labels[::2, 1:], numpy.arange(10, dtype=numpy.uint8), numpy.zeros((0, 3))]
+    for compression in ['zlib', 'lzma']:
+        options = {'compression': compression, 'chunk_size': 1 << 14, 'workers': 3}
+        with mimejson.MIMEJSON(prefer=('application/x-npy-compressed',),
+                               codec_options={'application/x-npy-compressed': options}) as mj:
+            encoded = json.loads(mj.dumps(arrays))
+            assert(all(e['$mimetype$'] == 'application/x-npy-compressed' for e in encoded))
+            assert(encoded[0]['$compression$'] == compression and len(encoded[0]['$chunks$']) == 15)
+            assert(encoded[0]['$length$'] * 20 < labels.nbytes and encoded[1]['$fortran_order$'])
+            decoded = mj.loadd(encoded)
+            for a, b in zip(arrays, decoded):
+                assert(a.dtype == b.dtype and a.shape == b.shape and (a == b).all())
+            assert(decoded[1].flags.f_contiguous)
+
+    with mimejson.MIMEJSON() as mj:
+        assert(json.loads(mj.dumps({'a': labels}))['a']['$mimetype$'] == 'application/npy')
+
+    for content_addressed in [False, True]:
+        storage = mimejson.storage.MemoryStorage()
+        with mimejson.MIMEJSON(prefer=('application/x-npy-compressed',), storage=storage,
+                               content_addressed=content_addressed) as mj:
+            with pytest.raises(ValueError):
+                mj.dumps({'a': labels, 'b': numpy.array([{}, 1], dtype=object)})
+            assert(len(storage.blobs) == 1)
+
+
+def test_mimejson_chunked_arrays_read_slices_partially():
+    """
+    MIMEJSON chunked arrays are decoded as arrays whose slices only read the chunks they overlap.
+    """
+    a = numpy.arange(60 * 50 * 3, dtype=numpy.float32).reshape(60, 50, 3)
+    keys = [(slice(5, 25), slice(None, None, 7)), (Ellipsis, 1), (-1, slice(48, 3, -3), 2), 7, (slice(0, 0),)]
+    for options, touched in [({'chunk_shape': (16, 16, 3)}, 2), ({'chunk_bytes': 4096, 'compression': 'zlib'}, 1)]:
+        with mimejson.MIMEJSON(prefer=('application/x-npy-chunked',),
+                               codec_options={'application/x-npy-chunked': options}) as mj:
+            encoded = json.loads(mj.dumps({'a': a}))
+            assert(encoded['a']['$mimetype$'] == 'application/x-npy-chunked')
+            chunked = mj.loadd(encoded)['a']
+            assert(chunked.shape == a.shape and chunked.dtype == a.dtype)
+            for key in keys:
+                assert(numpy.array_equal(chunked[key], a[key]))
+            assert(numpy.array_equal(numpy.asarray(chunked), a))
+
+            reads = []
+            reader = chunked.reader
+            chunked.reader = lambda offset, length: reads.append(offset) or reader(offset, length)
+            chunked[20:30, 40:]
+            assert(len(reads) == touched)
+
+    with mimejson.MIMEJSON(prefer=('application/x-npy-chunked',)) as mj:
+        scalar = mj.loads(mj.dumps({'s': numpy.array(3.5)}))['s']
+        assert(scalar.shape == () and scalar[()] == 3.5 and numpy.asarray(scalar).shape == ())
+        mj.codec_options = {'application/x-npy-chunked': {'chunk_shape': (16, 16)}}
+        with pytest.raises(ValueError):
+            mj.dumps({'a': a})
+
+
+def test_mimejson_image_codecs():
+    """
+    MIMEJSON stores JPEG images as JPEG and other images as PNG, with quality options and draft decoding.
+    """
+    import PIL.Image
+
+    pixels = numpy.random.RandomState(0).randint(0, 255, (480, 640, 3)).astype(numpy.uint8)
+    image = PIL.Image.fromarray(pixels)
+    out = io.BytesIO()
+    image.save(out, format="JPEG")
+    jpeg = PIL.Image.open(io.BytesIO(out.getvalue()))
+
+    options = {'image/jpg': {'quality': 20, 'draft_size': (160, 120)}, 'image/png': {'compress_level': 1}}
+    with mimejson.MIMEJSON(codec_options=options) as mj:
+        assert(mj.codecs.lookup(image) is mj.codecs['image/png'])
+        assert(mj.codecs.lookup(jpeg) is mj.codecs['image/jpg'])
+        assert(not mj.codecs['image/jpg'].can_apply(image) and not mj.codecs['image/png'].can_apply(jpeg))
+        encoded = json.loads(mj.dumps({'png': image, 'jpg': jpeg}))
+        assert(encoded['jpg']['$mimetype$'] == 'image/jpg' and encoded['jpg']['$length$'] < len(out.getvalue()))
+        decoded = mj.loadd(encoded)
+        assert(numpy.array_equal(numpy.asarray(decoded['png']), pixels))
+        assert(decoded['jpg'].size == (160, 120) and decoded['jpg'].load() is not None)
+
+
+def test_mimejson_video_frames_are_read_lazily():
+    """
+    MIMEJSON encodes videos from frame iterators and decodes them as lazy, sliceable frame sequences.
+    """
+    pytest.importorskip("cv2")
+
+    def frames():
+        for i in range(30):
+            frame = numpy.zeros((48, 64, 3), dtype=numpy.uint8)
+            frame[:, :, 1] = i * 8
+            yield frame
+
+    for storage in [None, mimejson.MemoryStorage()]:
+        with mimejson.MIMEJSON(storage=storage) as mj:
+            encoded = json.loads(mj.dumps({'v': mimejson.Video(frames(), fps=10, fourcc="MJPG")}))
+            assert(encoded['v']['$frame_count$'] == 30 and encoded['v']['$frame_size$'] == [64, 48])
+            video = mj.loadd(encoded)['v']
+            assert(len(video) == 30 and len(video[5:25:5]) == 4)
+            for i, frame in zip(range(5, 25, 5), video[5:25:5]):
+                assert(frame.shape == (48, 64, 3) and abs(int(frame[0, 0, 1]) - i * 8) < 8)
+            assert(abs(int(video[-1][0, 0, 1]) - 29 * 8) < 8 and abs(int(video[2][0, 0, 1]) - 16) < 8)
+
+
+def test_mimejson_dumps_many_stacks_arrays():
+    """
+    MIMEJSON batches store arrays found at the same path with the same shape and dtype as one stacked array.
+    """
+    docs = [{'id': i, 'x': numpy.full((4, 3), i, dtype=numpy.float32), 'y': [numpy.arange(i)]} for i in range(10)]
+    with mimejson.MIMEJSON() as mj:
+        encoded = mj.dumps_many(docs)
+        envelopes = [json.loads(e)['x'] for e in encoded]
+        assert(len(set(e['$path$'] for e in envelopes)) == 1 and [e['$index$'] for e in envelopes] == list(range(10)))
+        assert(len(os.listdir(mj.storage)) == 11)
+
+        decoded = mj.loads_many(encoded)
+        base = decoded[0]['x'].base
+        assert(base is not None and all(d['x'].base is base for d in decoded))
+        for doc, d in zip(docs, decoded):
+            assert(d['id'] == doc['id'] and numpy.array_equal(d['x'], doc['x']))
+            assert(numpy.array_equal(d['y'][0], doc['y'][0]))
+        assert(numpy.array_equal(mj.loads(encoded[3])['x'], docs[3]['x']))
+
+        lazily = list(mj.iterloads_many(mj.iterdumps_many(iter(docs), batch_size=4), lazy=True, batch_size=4))
+        assert(all(numpy.array_equal(d['x'].materialize(), doc['x']) for doc, d in zip(docs, lazily)))
+
+
+def test_mimejson_instrumentation():
+    """
+    MIMEJSON measures codec calls, walks and JSON when given an instrumentation, and reports them to callbacks.
+    """
+    measures = []
+    instrumentation = mimejson.Instrumentation([lambda *m: measures.append(m)])
+    a = numpy.arange(1000, dtype=numpy.float64)
+    with mimejson.MIMEJSON(instrumentation=instrumentation) as mj:
+        data = mj.dumps({'a': a, 'b': [a, 1]})
+        assert(numpy.array_equal(mj.loads(data)['b'][0], a))
+
+    stats = instrumentation.snapshot()
+    encode, decode = stats['codec.encode']['application/npy'], stats['codec.decode']['application/npy']
+    assert(encode['calls'] == decode['calls'] == 2)
+    assert(encode['bytes_in'] == decode['bytes_out'] == 2 * a.nbytes)
+    assert(encode['bytes_out'] == decode['bytes_in'] > 2 * a.nbytes)
+    assert(stats['json']['dumps']['bytes_out'] == stats['json']['loads']['bytes_in'] == len(data))
+    assert(stats['walk']['encode']['calls'] == stats['walk']['decode']['calls'] == 1)
+    assert(stats['walk']['encode']['seconds'] >= encode['seconds'] > 0)
+    assert(len(measures) == 8 and measures[0][:2] == ('codec.encode', 'application/npy'))
+
+    code = ("import mimejson, numpy\n"
+            "with mimejson.MIMEJSON(instrumentation=True) as mj:\n"
+            "    assert mj.codecs.instrumentation is mj.instrumentation\n"
+            "    mj.dumps(numpy.eye(2))\n"
+            "assert mimejson.CodecRegister.get_instance().instrumentation is None\n"
+            "assert mj.instrumentation.snapshot()['codec.import']['mimejson.mimetype.numpy']['calls'] == 1\n")
+    subprocess.check_call([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(mimejson.__file__)))
+
+    instrumentation.reset()
+    assert(instrumentation.snapshot() == {})
+    with mimejson.MIMEJSON() as mj:
+        assert(mj.instrumentation is None and mj.loads(mj.dumps(1)) == 1)
+
+
+def test_mimejson_record_streams(tmpdir):
+    """
+    MIMEJSON record streams append records to a segment, with their objects in a sibling directory, and read
+    them one by one or by number, wherever the stream is moved.
+    """
+    path = os.path.join(str(tmpdir), "events", "events.ndjson")
+    os.makedirs(os.path.dirname(path))
+    records = [{'id': i, 'x': numpy.full(64, i), 'tags': ["a"] * i} for i in range(20)]
+    with mimejson.RecordWriter(path) as writer:
+        assert([writer.append(r) for r in records[:15]] == list(range(15)))
+    with open(path, 'rb') as fp:
+        lines = fp.read().splitlines()
+    assert(len(lines) == 15 and all(not json.loads(line)['x']['$path$'].startswith("/") for line in lines))
+    assert(len(os.listdir(path + ".blobs")) == 15 and os.path.getsize(path + ".idx") == 15 * 8)
+
+    # an interrupted writer leaves a partial record and a stale index
+    with open(path, 'ab') as fp:
+        fp.write(b'{"id": 15, "x"')
+    os.truncate(path + ".idx", 3 * 8 + 5)
+    external = os.path.join(str(tmpdir), "external.txt")
+    with open(external, 'w') as fp:
+        fp.write("attached")
+    with mimejson.RecordWriter(path) as writer, open(external, 'rb') as fp:
+        assert(len(writer) == 15)
+        writer.extend(records[15:])
+        assert(writer.append({'file': fp}) == 20)
+    os.unlink(external)
+
+    os.rename(os.path.join(str(tmpdir), "events"), os.path.join(str(tmpdir), "moved"))
+    with mimejson.RecordReader(os.path.join(str(tmpdir), "moved", "events.ndjson")) as reader:
+        assert(len(reader) == 21)
+        with reader[20]['file'] as fp:
+            assert(fp.read() == "attached")
+        for r, d in zip(records, reader):
+            assert(d['id'] == r['id'] and d['tags'] == r['tags'] and (d['x'] == r['x']).all())
+        assert(reader[7]['id'] == 7 and reader[-2]['id'] == 19 and (reader[12]['x'] == 12).all())
+        tail = list(reader.records(17))
+        tail[-1]['file'].close()
+        assert([d.get('id') for d in tail] == [17, 18, 19, None] and list(reader.records(21)) == [])
@@ -0,0 +1,330 @@
+#!/usr/bin/env python2
+# ############################################################################
+# |W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|W|I|D|E|I|O|L|T|D|
+# Copyright (c) WIDE IO LTD 2014-2016
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the WIDE IO LTD nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+# |D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|D|O|N|O|T|R|E|M|O|V|E|!|
+# ############################################################################
+
+import asyncio
+import email.parser
+import email.policy
+import http.server
+import io
+import json
+import os
+import threading
+
+import mimejson
+import numpy
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    """
+    Stand-in for a MIMEJSON server: serves files from its directory and echoes multipart queries.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.headers)
+        self.server.clients.append(self.client_address)
+        if self.server.failures:
+            self.server.failures -= 1
+            self.send_error(503)
+            return
+        fn = os.path.join(self.server.directory, self.path.lstrip("/"))
+        if not os.path.isfile(fn):
+            self.send_error(404)
+            return
+        st = os.stat(fn)
+        etag = '"%x-%x"' % (st.st_mtime_ns, st.st_size)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        with open(fn, 'rb') as fp:
+            content = fp.read()
+        total = len(content)
+        ranged = self.headers.get('Range')
+        self.server.ranges.append(ranged)
+        if ranged:
+            start, end = ranged.split("=", 1)[1].split("-")
+            start, end = int(start), min(int(end), total - 1)
+            content = content[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, end, total))
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding') != 'chunked':
+            return self.rfile.read(int(self.headers['Content-Length']))
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if size == 0:
+                self.rfile.readline()
+                return b"".join(chunks)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def do_POST(self):
+        body = self._read_body()
+        head = ("Content-Type: %s\r\n\r\n" % (self.headers['Content-Type'],)).encode('ascii')
+        msg = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(head + body)
+        result = {'fields': {}, 'files': {}}
+        for part in msg.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            payload = part.get_payload(decode=True)
+            if part.get_filename() is None:
+                try:
+                    result['fields'][name] = json.loads(payload.decode('utf-8'))
+                except ValueError:
+                    result['fields'][name] = payload.decode('utf-8')
+            else:
+                assert(int(part['Content-Length']) == len(payload))
+                result['files'][name] = len(payload)
+        content = json.dumps(result).encode('utf-8')
+        self.server.requests.append(self.headers)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class _Server(object):
+
+    def __init__(self, directory):
+        self.httpd = _HTTPServer(("127.0.0.1", 0), _Handler)
+        self.httpd.directory = directory
+        self.httpd.requests = []
+        self.httpd.clients = []
+        self.httpd.failures = 0
+        self.httpd.ranges = []
+        self.url = "http://127.0.0.1:%d/" % (self.httpd.server_address[1],)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _serve_document(mj, directory, data):
+    """
+    Dump a document in a directory, with paths of objects rewritten as URLs of the server.
+    """
+    encoded = json.loads(mj.dumps(data))
+    for k, v in encoded.items():
+        if isinstance(v, dict) and '$path$' in v:
+            fn = os.path.basename(v['$path$'])
+            os.rename(v['$path$'], os.path.join(directory, fn))
+            v['$path$'] = mj.transport.url + fn
+    with open(os.path.join(directory, "doc.json"), 'w') as fp:
+        json.dump(encoded, fp)
+    return mj.transport.url + "doc.json"
+
+
+def test_push_async_sends_objects_as_multipart_parts(tmpdir):
+    """
+    MIMEJSON pushes documents as multipart queries, with a part per stored object.
+    """
+    with _Server(str(tmpdir)) as server:
+        with mimejson.MIMEJSON(server.url, "user", "password") as mj:
+            data = {'a': numpy.arange(100), 'b': {'c': 1}, 'd': "e"}
+            result = asyncio.run(mj.push_async(data, server.url))
+            assert(result['fields']['b'] == {'c': 1} and result['fields']['d'] == "e")
+            assert(result['fields']['a']['$mimetype$'] == 'application/npy')
+            assert(result['files'] == {'a': result['fields']['a']['$length$']})
+            assert(server.httpd.requests[-1]['Authorization'].startswith("Basic "))
+
+
+def test_load_async_downloads_remote_objects(tmpdir):
+    """
+    MIMEJSON asynchronous loads download remote objects concurrently.
+    """
+    with _Server(str(tmpdir)) as server:
+        with mimejson.MIMEJSON(server.url, "user", "password") as mj:
+            data = dict(("a%d" % i, numpy.arange(i)) for i in range(10))
+            uri = _serve_document(mj, str(tmpdir), data)
+
+            async def _load_many():
+                return await asyncio.gather(*[mj.load_async(uri) for _ in range(4)])
+
+            # the client can be used by successive event loops
+            for _ in range(2):
+                for decoded in asyncio.run(_load_many()):
+                    assert(all((decoded[k] == data[k]).all() for k in data))
+
+
+def test_transport_keeps_connections_alive_and_retries(tmpdir):
+    """
+    MIMEJSON HTTP transport reuses its connections and retries failed requests.
+    """
+    tmpdir.join("blob").write("content")
+    with _Server(str(tmpdir)) as server:
+        transport = mimejson.mimejson.HTTPTransport(server.url, retries=2, backoff_factor=0)
+        for _ in range(3):
+            assert(transport.get(server.url + "blob") == b"content")
+        assert(len(set(server.httpd.clients)) == 1)
+
+        server.httpd.failures = 2
+        with mimejson.MIMEJSON(server.url, transport=transport) as mj:
+            assert(mj.transport is transport)
+            assert(mj.transport.get(server.url + "blob") == b"content")
+        pools = transport.session.get_adapter(server.url).poolmanager.pools
+        assert(len(pools) == 1)
+        transport.close()
+        assert(len(pools) == 0)
+
+        with mimejson.MIMEJSON(server.url) as mj:
+            assert(mj.transport.get(server.url + "blob") == b"content")
+            pools = mj.transport.session.get_adapter(server.url).poolmanager.pools
+            assert(len(pools) == 1)
+        assert(len(pools) == 0)
+
+
+def test_push_streams_multipart_queries(tmpdir):
+    """
+    MIMEJSON HTTP transport streams multipart queries, with a Content-Length or chunked.
+    """
+    data = {'a': numpy.arange(1 << 18), 'b': [numpy.eye(3)], 'c': "d"}
+    with _Server(str(tmpdir)) as server:
+        for chunked in [False, True]:
+            transport = mimejson.mimejson.HTTPTransport(server.url, chunked=chunked)
+            with mimejson.MIMEJSON(server.url, transport=transport) as mj:
+                result = mj.push(data, server.url)
+                assert(result['files'] == {'a': (1 << 18) * 8 + 128, 'b.0': 200})
+                assert(result['fields']['c'] == "d" and result['fields']['b'][0]['$length$'] == 200)
+                assert(('Transfer-Encoding' in server.httpd.requests[-1]) == chunked)
+
+        with mimejson.MIMEJSON(server.url) as mj:
+            result = asyncio.run(mj.push_async(data, server.url))
+            assert(result['files'] == {'a': (1 << 18) * 8 + 128, 'b.0': 200})
+
+        with mimejson.MIMEJSON(server.url, json_backend='auto') as mj:
+            for result in [mj.push(data, server.url), asyncio.run(mj.push_async(data, server.url))]:
+                assert(result['fields']['c'] == "d" and result['fields']['b'][0]['$length$'] == 200)
+
+
+def test_load_downloads_large_objects_with_range_requests(tmpdir):
+    """
+    MIMEJSON loads remote objects, and downloads large ones with parallel range requests.
+    """
+    data = {'a': numpy.arange(1 << 16), 'b': numpy.eye(3)}
+    with _Server(str(tmpdir)) as server:
+        instrumentation = mimejson.Instrumentation()
+        transport = mimejson.mimejson.HTTPTransport(server.url, range_threshold=1 << 12, range_size=1 << 14,
+                                                    instrumentation=instrumentation)
+        with mimejson.MIMEJSON(server.url, transport=transport) as mj:
+            uri = _serve_document(mj, str(tmpdir), data)
+            decoded = mj.load(uri)
+            assert((decoded['a'] == data['a']).all() and (decoded['b'] == data['b']).all())
+            assert(len([r for r in server.httpd.ranges if r]) == 33)
+            downloads = instrumentation.snapshot()['transport']['download']
+            size = os.path.getsize(os.path.join(str(tmpdir), "doc.json"))
+            assert(downloads['calls'] == 3 and downloads['bytes_in'] == size + (1 << 16) * 8 + 128 + 200)
+
+            mj.memory_download_limit = 0
+            decoded = mj.load(uri)
+            assert((decoded['a'] == data['a']).all() and (decoded['b'] == data['b']).all())
+
+
+def test_load_reuses_cached_remote_objects(tmpdir):
+    """
+    MIMEJSON caches remote objects on disk, revalidates them with their ETag and evicts the least recently used.
+    """
+    served, cached = tmpdir.mkdir("served"), str(tmpdir.join("cache"))
+    data = dict(("a%d" % i, numpy.arange(1000) * i) for i in range(4))
+    with _Server(str(served)) as server:
+        with mimejson.MIMEJSON(server.url, cache=cached) as mj:
+            uri = _serve_document(mj, str(served), data)
+            for _ in range(2):
+                decoded = mj.load(uri)
+                assert(all((decoded[k] == data[k]).all() for k in data))
+            # the document twice, and its objects once
+            assert(len(server.httpd.ranges) == 6)
+            assert(len(os.listdir(cached)) == 8)
+
+            conditional = [h for h in server.httpd.requests if 'If-None-Match' in h]
+            assert(len(conditional) == 4)
+
+            mj.cache = mimejson.BlobCache(cached, max_size=3 * 8128, revalidate=False)
+            decoded = mj.load(uri)
+            assert(len(server.httpd.ranges) == 7)
+            mj.cache.evict()
+            assert(len(os.listdir(cached)) == 7)
+
+
+def test_load_reads_slices_of_remote_chunked_arrays(tmpdir):
+    """
+    MIMEJSON reads the chunks of remote chunked arrays overlapped by slices with range requests.
+    """
+    data = {'a': numpy.arange(100 * 100).reshape(100, 100)}
+    with _Server(str(tmpdir)) as server:
+        with mimejson.MIMEJSON(server.url, prefer=('application/x-npy-chunked',),
+                               codec_options={'application/x-npy-chunked': {'chunk_shape': (10, 100)}}) as mj:
+            uri = _serve_document(mj, str(tmpdir), data)
+            decoded = mj.load(uri)['a']
+            del server.httpd.ranges[:]
+            assert(numpy.array_equal(decoded[15:35, 5], data['a'][15:35, 5]))
+            assert(len(server.httpd.ranges) == 3)
+            assert(set(server.httpd.ranges) == {"bytes=8000-15999", "bytes=16000-23999", "bytes=24000-31999"})
+
+
+def test_multipart_body_reads_as_a_file():
+    """
+    Multipart bodies read by sized and unsized reads give the same content as their chunks.
+    """
+    def body():
+        return mimejson.multipart.MultipartBody({'a': {'b': 1}, 'c': "d"}, {'e': io.BytesIO(b"f" * 100)}, "boundary")
+
+    content = b"".join(body())
+    assert(len(content) == len(body()))
+    reader = body()
+    assert(reader.read(7) + reader.read(30) + reader.read() == content)